@@ -7,7 +7,7 @@ from app.schemas import UserCreate, UserLogin, UserResponse, Token, GoogleAuthRe
 from app.auth import (
     authenticate_user, 
     create_access_token, 
-    get_password_hash, 
+    get_password_hash_async, 
     verify_google_token, 
     create_or_get_google_user,
     get_current_active_user
@@ -37,7 +37,7 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
         )
     
     # Create new user
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash_async(user_data.password)
     db_user = User(
         email=user_data.email,
         username=user_data.username,
@@ -56,7 +56,7 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
 @router.post("/login", response_model=Token)
 async def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
     """Login user and return access token"""
-    user = authenticate_user(db, user_credentials.email, user_credentials.password)
+    user = await authenticate_user(db, user_credentials.email, user_credentials.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -76,7 +76,7 @@ async def google_auth(google_data: GoogleAuthRequest, db: Session = Depends(get_
     """Authenticate user with Google OAuth"""
     try:
         # Verify Google token
-        google_user_info = verify_google_token(google_data.token)
+        google_user_info = await verify_google_token(google_data.token)
         if not google_user_info:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -3,9 +3,10 @@ from sqlalchemy.orm import Session
 from sqlalchemy import and_
 from typing import List
 from app.database import get_db
-from app.models import CartItem, Product, User
-from app.schemas import CartItemCreate, CartItemResponse, CartItemUpdate
+from app.models import Product, User
+from app.schemas import CartItemCreate, CartItemResponse, CartItemUpdate, CartBatchRequest
 from app.auth import get_current_active_user
+from app.services.cart_store import cart_store
 from uuid import UUID
 
 router = APIRouter(prefix="/cart", tags=["cart"])
@@ -16,8 +17,7 @@ async def get_cart_items(
     current_user: User = Depends(get_current_active_user)
 ):
     """Get user's cart items"""
-    cart_items = db.query(CartItem).filter(CartItem.user_id == current_user.id).all()
-    return cart_items
+    return cart_store.list_items(db, current_user.id)
 
 @router.post("/", response_model=CartItemResponse)
 async def add_to_cart(
@@ -37,33 +37,26 @@ async def add_to_cart(
     if product.stock_quantity < cart_item.quantity:
         raise HTTPException(status_code=400, detail="Not enough stock available")
     
-    # Check if item already exists in cart
-    existing_item = db.query(CartItem).filter(
-        and_(
-            CartItem.user_id == current_user.id,
-            CartItem.product_id == cart_item.product_id
-        )
-    ).first()
+    # Adds to the existing line if the product is already in the cart
+    return cart_store.add_item(db, current_user.id, product, cart_item.quantity)
+
+@router.post("/batch", response_model=List[CartItemResponse])
+async def batch_update_cart(
+    batch: CartBatchRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Apply many adds and quantity changes in one transaction and return the cart"""
+    # Collapse repeated products into one change each, in request order
+    changes = {}
+    for item in batch.items:
+        previous = changes.get(item.product_id)
+        if item.mode == "add" and previous:
+            changes[item.product_id] = (previous[0], previous[1] + item.quantity)
+        else:
+            changes[item.product_id] = (item.mode, item.quantity)
     
-    if existing_item:
-        # Update quantity
-        existing_item.quantity += cart_item.quantity
-        if existing_item.quantity > product.stock_quantity:
-            raise HTTPException(status_code=400, detail="Not enough stock available")
-        db.commit()
-        db.refresh(existing_item)
-        return existing_item
-    else:
-        # Create new cart item
-        db_cart_item = CartItem(
-            user_id=current_user.id,
-            product_id=cart_item.product_id,
-            quantity=cart_item.quantity
-        )
-        db.add(db_cart_item)
-        db.commit()
-        db.refresh(db_cart_item)
-        return db_cart_item
+    return cart_store.apply_batch(db, current_user.id, changes)
 
 @router.put("/{cart_item_id}", response_model=CartItemResponse)
 async def update_cart_item(
@@ -73,12 +66,7 @@ async def update_cart_item(
     current_user: User = Depends(get_current_active_user)
 ):
     """Update cart item quantity"""
-    cart_item = db.query(CartItem).filter(
-        and_(
-            CartItem.id == cart_item_id,
-            CartItem.user_id == current_user.id
-        )
-    ).first()
+    cart_item = cart_store.get_item(db, current_user.id, cart_item_id)
     
     if not cart_item:
         raise HTTPException(status_code=404, detail="Cart item not found")
@@ -87,10 +75,7 @@ async def update_cart_item(
     if cart_item_update.quantity > cart_item.product.stock_quantity:
         raise HTTPException(status_code=400, detail="Not enough stock available")
     
-    cart_item.quantity = cart_item_update.quantity
-    db.commit()
-    db.refresh(cart_item)
-    return cart_item
+    return cart_store.set_quantity(db, current_user.id, cart_item, cart_item_update.quantity)
 
 @router.delete("/{cart_item_id}")
 async def remove_from_cart(
@@ -99,18 +84,12 @@ async def remove_from_cart(
     current_user: User = Depends(get_current_active_user)
 ):
     """Remove item from cart"""
-    cart_item = db.query(CartItem).filter(
-        and_(
-            CartItem.id == cart_item_id,
-            CartItem.user_id == current_user.id
-        )
-    ).first()
+    cart_item = cart_store.get_item(db, current_user.id, cart_item_id)
     
     if not cart_item:
         raise HTTPException(status_code=404, detail="Cart item not found")
     
-    db.delete(cart_item)
-    db.commit()
+    cart_store.remove_item(db, current_user.id, cart_item)
     
     return {"message": "Item removed from cart"}
 
@@ -120,7 +99,7 @@ async def clear_cart(
     current_user: User = Depends(get_current_active_user)
 ):
     """Clear all items from cart"""
-    db.query(CartItem).filter(CartItem.user_id == current_user.id).delete()
+    cart_store.clear(db, current_user.id)
     db.commit()
     
     return {"message": "Cart cleared"}
@@ -131,8 +110,4 @@ async def get_cart_count(
     current_user: User = Depends(get_current_active_user)
 ):
     """Get total number of items in cart"""
-    cart_items = db.query(CartItem).filter(CartItem.user_id == current_user.id).all()
-    total_count = sum(item.quantity for item in cart_items)
-    
-    return {"count": total_count}
-
+    return {"count": cart_store.count(db, current_user.id)}
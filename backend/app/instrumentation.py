@@ -0,0 +1,178 @@
+import threading
+import time
+from collections import deque
+from typing import Dict, Tuple
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+class LatencyStats:
+    """Thread-safe call counters plus percentiles over the most recent samples"""
+
+    def __init__(self, window: int = 1000):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.outcomes: Dict[str, int] = {}
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, elapsed_seconds: float, outcome: str = "ok"):
+        elapsed_ms = elapsed_seconds * 1000
+        with self._lock:
+            self._samples.append(elapsed_ms)
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            samples = sorted(self._samples)
+            outcomes = dict(self.outcomes)
+            total_ms, max_ms = self.total_ms, self.max_ms
+        count = sum(outcomes.values())
+
+        def percentile(fraction: float) -> float:
+            if not samples:
+                return 0.0
+            return round(samples[min(len(samples) - 1, int(len(samples) * fraction))], 2)
+
+        return {
+            "count": count,
+            **outcomes,
+            "avg_ms": round(total_ms / count, 2) if count else 0.0,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(max_ms, 2)
+        }
+
+class LatencyRegistry:
+    """Named LatencyStats, e.g. one per external API operation"""
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._stats: Dict[str, LatencyStats] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> LatencyStats:
+        with self._lock:
+            if name not in self._stats:
+                self._stats[name] = LatencyStats(self.window)
+            return self._stats[name]
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            stats = dict(self._stats)
+        return {name: entry.snapshot() for name, entry in stats.items()}
+
+class PoolMetrics:
+    """Checkout waits and connection churn for one SQLAlchemy connection pool.
+
+    Counters come from pool events. The time spent waiting for a connection
+    is measured by the Instrumented*QueuePool classes below, since no pool
+    event fires before a checkout blocks.
+    """
+
+    # Upper bounds (ms) of the checkout wait histogram buckets
+    WAIT_BUCKETS_MS: Tuple[float, ...] = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.wait = LatencyStats()
+        self.wait_histogram = [0] * (len(self.WAIT_BUCKETS_MS) + 1)
+        self.stats = {
+            "checkouts": 0,
+            "checkins": 0,
+            "timeouts": 0,
+            "connects": 0,
+            "closes": 0,
+            "invalidations": 0,
+            "recycles": 0
+        }
+
+    def _count(self, stat: str):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def record_wait(self, elapsed_seconds: float, outcome: str = "ok"):
+        elapsed_ms = elapsed_seconds * 1000
+        bucket = next(
+            (i for i, bound in enumerate(self.WAIT_BUCKETS_MS) if elapsed_ms <= bound),
+            len(self.WAIT_BUCKETS_MS)
+        )
+        with self._lock:
+            self.wait_histogram[bucket] += 1
+            if outcome == "timeout":
+                self.stats["timeouts"] += 1
+        self.wait.record(elapsed_seconds, outcome)
+
+    def attach(self, target):
+        """Listen to the connection lifecycle events of a pool (or an engine's pool)"""
+        @event.listens_for(target, "connect")
+        def on_connect(dbapi_connection, connection_record):
+            # record_info survives reconnects: a second connect on the same
+            # record replaced a connection that was recycled or invalidated
+            if connection_record.record_info.pop("connected", False):
+                if not connection_record.record_info.pop("invalidated", False):
+                    self._count("recycles")
+            connection_record.record_info["connected"] = True
+            self._count("connects")
+
+        @event.listens_for(target, "checkout")
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            self._count("checkouts")
+
+        @event.listens_for(target, "checkin")
+        def on_checkin(dbapi_connection, connection_record):
+            self._count("checkins")
+
+        @event.listens_for(target, "close")
+        def on_close(dbapi_connection, connection_record):
+            self._count("closes")
+
+        @event.listens_for(target, "invalidate")
+        @event.listens_for(target, "soft_invalidate")
+        def on_invalidate(dbapi_connection, connection_record, exception):
+            connection_record.record_info["invalidated"] = True
+            self._count("invalidations")
+
+    def snapshot(self, pool) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            histogram = list(self.wait_histogram)
+        labels = [f"<={bound}ms" for bound in self.WAIT_BUCKETS_MS] + [f">{self.WAIT_BUCKETS_MS[-1]}ms"]
+        return {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            **stats,
+            "checkout_wait": self.wait.snapshot(),
+            "checkout_wait_histogram": dict(zip(labels, histogram))
+        }
+
+class _TimedCheckout:
+    """Mixin timing how long each checkout waits for a free connection"""
+
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            # No connection became free within pool_timeout
+            self.metrics.record_wait(time.perf_counter() - start, "timeout")
+            raise
+        except Exception:
+            self.metrics.record_wait(time.perf_counter() - start, "error")
+            raise
+        self.metrics.record_wait(time.perf_counter() - start)
+        return connection
+
+# One PoolMetrics per class (one engine each), so the counters carry over
+# when engine.dispose() recreates the pool
+class InstrumentedQueuePool(_TimedCheckout, QueuePool):
+    metrics = PoolMetrics()
+
+class InstrumentedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    metrics = PoolMetrics()
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, String, Integer, Float, Boolean, DateTime, Text, ForeignKey, ARRAY, DECIMAL, JSON
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, Integer, Float, Boolean, DateTime, Text, ForeignKey, ARRAY, DECIMAL, JSON, Computed, Index, UniqueConstraint
+from sqlalchemy.dialects.postgresql import UUID, TSVECTOR
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql import func
 from app.database import Base
 import uuid
@@ -48,6 +48,7 @@ class Product(Base):
     __tablename__ = "products"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    sku = Column(String(100), unique=True, index=True)
     name = Column(String(255), nullable=False)
     description = Column(Text)
     price = Column(DECIMAL(10, 2), nullable=False)
@@ -59,15 +60,39 @@ class Product(Base):
     is_featured = Column(Boolean, default=False)
     rating = Column(Float, default=0.0)
     review_count = Column(Integer, default=0)
+    rating_total = Column(Integer, default=0)  # Sum of review ratings, so rating = rating_total / review_count
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
+    # Full-text search document, maintained by Postgres on every insert/update.
+    # Deferred: only the search WHERE clause reads it, never the loaded rows
+    search_vector = deferred(Column(
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(description, '')), 'B')",
+            persisted=True
+        )
+    ))
+
     # Relationships
     category = relationship("Category", back_populates="products")
     cart_items = relationship("CartItem", back_populates="product", cascade="all, delete-orphan")
     order_items = relationship("OrderItem", back_populates="product")
     reviews = relationship("Review", back_populates="product", cascade="all, delete-orphan")
 
+    # Search and keyset pagination indexes
+    __table_args__ = (
+        Index("idx_products_created_at_id", "created_at", "id"),
+        Index("idx_products_category_created_at_id", "category_id", "created_at", "id"),
+        Index("idx_products_search_vector", "search_vector", postgresql_using="gin"),
+        Index(
+            "idx_products_name_trgm", "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"}
+        ),
+    )
+
 
 class CartItem(Base):
     __tablename__ = "cart_items"
@@ -85,6 +110,7 @@ class CartItem(Base):
 
     # Unique constraint
     __table_args__ = (
+        UniqueConstraint('user_id', 'product_id', name='cart_items_user_id_product_id_key'),
         {'extend_existing': True}
     )
 
@@ -98,6 +124,10 @@ class Order(Base):
     status = Column(String(50), default="pending")
     payment_method = Column(String(50))
     payment_status = Column(String(50), default="pending")
+    payment_intent_id = Column(String(255))
+    payment_client_secret = Column(String(255))
+    payment_intent_amount = Column(DECIMAL(10, 2))
+    payment_intent_currency = Column(String(3))
     shipping_address = Column(JSON)
     billing_address = Column(JSON)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -107,6 +137,65 @@ class Order(Base):
     user = relationship("User", back_populates="orders")
     order_items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("idx_orders_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
+
+
+class StockReservation(Base):
+    __tablename__ = "stock_reservations"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    order_id = Column(UUID(as_uuid=True), ForeignKey("orders.id"), nullable=False, index=True)
+    product_id = Column(UUID(as_uuid=True), ForeignKey("products.id"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    status = Column(String(20), nullable=False, default="held")  # held, committed, released, expired
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("idx_stock_reservations_status_expires_at", "status", "expires_at"),
+    )
+
+
+class PaymentEvent(Base):
+    __tablename__ = "payment_events"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    event_id = Column(String(255), unique=True, nullable=False)  # Stripe event id
+    event_type = Column(String(100), nullable=False)
+    payment_intent_id = Column(String(255), nullable=False)
+    order_id = Column(UUID(as_uuid=True))  # From the intent's metadata, if any
+    status = Column(String(20), nullable=False, default="pending")  # pending, processed, dead
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text)
+    refund_due = Column(Boolean, nullable=False, default=False)  # Paid after its order was cancelled
+    next_attempt_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    processed_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        Index("idx_payment_events_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    key = Column(String(255), nullable=False)
+    request_path = Column(String(255), nullable=False)
+    request_hash = Column(String(64), nullable=False)
+    status = Column(String(20), nullable=False, default="in_progress")  # in_progress, completed
+    response_status = Column(Integer)
+    response_body = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        UniqueConstraint('user_id', 'key', name='idempotency_keys_user_id_key_key'),
+    )
+
 
 class OrderItem(Base):
     __tablename__ = "order_items"
@@ -155,6 +244,7 @@ class Review(Base):
 
     # Unique constraint
     __table_args__ = (
+        UniqueConstraint('user_id', 'product_id', name='reviews_user_id_product_id_key'),
         {'extend_existing': True}
     )
 
@@ -0,0 +1,97 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Optional, Tuple
+from uuid import UUID
+from fastapi import HTTPException
+from sqlalchemy import literal, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Response header carrying the cursor for the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def sort_key_name(sort_key) -> str:
+    """Name recorded in cursors: the column name, or "rank" for a computed
+    ordering such as search relevance"""
+    return getattr(sort_key, "key", None) or "rank"
+
+def encode_cursor(sort_value: Any, row_id: UUID, sort_name: str) -> str:
+    """Encode a (sort key, id) position as an opaque URL-safe token"""
+    if isinstance(sort_value, datetime):
+        payload = {"s": sort_name, "t": "dt", "k": sort_value.isoformat(), "id": str(row_id)}
+    else:
+        payload = {"s": sort_name, "t": "n", "k": sort_value, "id": str(row_id)}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort_name: str) -> Tuple[Any, UUID]:
+    """Decode a token produced by encode_cursor for the same sort key"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if payload["s"] != sort_name:
+            # e.g. a newest-first cursor replayed against a relevance-ordered search
+            raise HTTPException(status_code=400, detail="Cursor does not match this listing's sort order")
+        sort_value = payload["k"]
+        if payload["t"] == "dt":
+            sort_value = datetime.fromisoformat(sort_value)
+        elif not isinstance(sort_value, (int, float)):
+            raise ValueError("Invalid sort key")
+        return sort_value, UUID(payload["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _keyset_query(query, sort_key, tiebreaker, limit: int, skip: int, cursor: Optional[str]):
+    """Apply the cursor filter, ordering and limit to a Query or select()"""
+    if cursor:
+        sort_value, last_id = decode_cursor(cursor, sort_key_name(sort_key))
+        query = query.filter(
+            tuple_(sort_key, tiebreaker) < tuple_(
+                literal(sort_value, type_=sort_key.type),
+                literal(last_id, type_=tiebreaker.type)
+            )
+        )
+
+    query = query.add_columns(sort_key).order_by(sort_key.desc(), tiebreaker.desc())
+    if skip and not cursor:
+        query = query.offset(skip)
+    return query.limit(limit + 1)
+
+def _keyset_result(rows, sort_key, limit: int):
+    items = [row[0] for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last_item, last_sort_value = rows[limit - 1]
+        next_cursor = encode_cursor(last_sort_value, last_item.id, sort_key_name(sort_key))
+
+    return items, next_cursor
+
+def keyset_page(
+    query,
+    sort_key,
+    tiebreaker,
+    limit: int,
+    skip: int = 0,
+    cursor: Optional[str] = None
+):
+    """Fetch one page of ``query`` ordered by (sort_key, tiebreaker) descending.
+
+    With a cursor the page starts right after the encoded position, so every
+    page costs the same index range scan. Without one, ``skip`` is honoured as
+    a plain offset for older clients. Returns (items, next_cursor).
+    """
+    rows = _keyset_query(query, sort_key, tiebreaker, limit, skip, cursor).all()
+    return _keyset_result(rows, sort_key, limit)
+
+async def keyset_page_async(
+    db: AsyncSession,
+    stmt,
+    sort_key,
+    tiebreaker,
+    limit: int,
+    skip: int = 0,
+    cursor: Optional[str] = None
+):
+    """keyset_page for a select() run on an AsyncSession"""
+    result = await db.execute(_keyset_query(stmt, sort_key, tiebreaker, limit, skip, cursor))
+    return _keyset_result(result.all(), sort_key, limit)
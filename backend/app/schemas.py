@@ -76,6 +76,7 @@ class CategoryResponse(CategoryBase):
 
 # Product Schemas
 class ProductBase(BaseModel):
+    sku: Optional[str] = None
     name: str
     description: Optional[str] = None
     price: Decimal
@@ -103,6 +104,7 @@ class ProductResponse(ProductBase):
 
 
 class ProductUpdate(BaseModel):
+    sku: Optional[str] = None
     name: Optional[str] = None
     description: Optional[str] = None
     price: Optional[Decimal] = None
@@ -114,6 +116,58 @@ class ProductUpdate(BaseModel):
     is_featured: Optional[bool] = None
 
 
+class CategoryFacet(BaseModel):
+    category_id: Optional[UUID]
+    count: int
+
+
+class PriceRangeFacet(BaseModel):
+    label: str
+    min: int
+    max: Optional[int]
+    count: int
+
+
+class AvailabilityFacet(BaseModel):
+    in_stock: int
+    out_of_stock: int
+
+
+class ProductFacets(BaseModel):
+    categories: List[CategoryFacet]
+    price_ranges: List[PriceRangeFacet]
+    availability: AvailabilityFacet
+
+
+class ProductListingResponse(BaseModel):
+    items: List[ProductResponse]
+    facets: ProductFacets
+
+
+class ProductBatchResponse(BaseModel):
+    products: List[ProductResponse]
+    missing_ids: List[UUID] = []
+
+
+class AutocompleteSuggestion(BaseModel):
+    type: str  # "product" or "category"
+    id: UUID
+    name: str
+
+
+class ProductImportError(BaseModel):
+    line: int
+    error: str
+
+
+class ProductImportResponse(BaseModel):
+    processed: int
+    created: int
+    updated: int
+    failed: int
+    errors: List[ProductImportError] = []
+
+
 # Cart Schemas
 class CartItemBase(BaseModel):
     product_id: UUID
@@ -137,6 +191,17 @@ class CartItemUpdate(BaseModel):
     quantity: int
 
 
+class CartBatchItem(BaseModel):
+    product_id: UUID
+    quantity: int = Field(..., ge=0)
+    # "add" adds to the quantity already in the cart, "set" replaces it (0 removes the item)
+    mode: str = Field("add", pattern="^(add|set)$")
+
+
+class CartBatchRequest(BaseModel):
+    items: List[CartBatchItem] = Field(..., min_length=1, max_length=100)
+
+
 # Order Schemas
 class OrderBase(BaseModel):
     shipping_address: dict
@@ -172,6 +237,19 @@ class OrderResponse(OrderBase):
         from_attributes = True
 
 
+class OrderSummaryResponse(BaseModel):
+    """An order without its addresses and line items, for history listings"""
+    id: UUID
+    total_amount: Decimal
+    status: str
+    payment_status: str
+    payment_method: Optional[str] = None
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+
 # Chat Schemas
 class ChatMessageBase(BaseModel):
     message: str
@@ -216,9 +294,10 @@ class ReviewResponse(ReviewBase):
 
 # Payment Schemas
 class PaymentIntentCreate(BaseModel):
-    amount: Decimal
     currency: str = "usd"
-    order_id: UUID
+    # Ignored - the order's total is always charged. Kept for older clients.
+    amount: Optional[Decimal] = None
+    order_id: Optional[UUID] = None
 
 
 class PaymentIntentResponse(BaseModel):
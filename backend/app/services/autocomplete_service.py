@@ -0,0 +1,234 @@
+import asyncio
+import bisect
+import heapq
+import math
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Set, Tuple
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models import Product, Category
+
+class AutocompleteService:
+    """In-process typeahead index over active product and category names.
+
+    Every word-start suffix of a name ("tractor hydraulic pump", "hydraulic
+    pump", "pump") is kept in one sorted array, so a prefix lookup is a binary
+    search plus a forward scan over the matches and never touches the
+    database. Short prefixes match most of the catalog, so their top
+    ``top_size`` entries are precomputed instead of ranked per keystroke;
+    longer ones are ranked on first use and kept in an LRU of
+    ``ranked_cache_size`` prefixes until a write touches them.
+    """
+
+    def __init__(self, top_prefix_length: int = 3, top_size: int = 20, ranked_cache_size: int = 10000):
+        self.top_prefix_length = top_prefix_length
+        self.top_size = top_size
+        self.ranked_cache_size = ranked_cache_size
+        self._keys: List[Tuple[str, str]] = []
+        self._entries: Dict[str, dict] = {}
+        self._top: Dict[str, List[str]] = {}
+        self._ranked: "OrderedDict[str, List[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _normalize(self, text: str) -> str:
+        return " ".join(re.findall(r"\w+", text.lower()))
+
+    def _suffixes(self, name: str) -> List[str]:
+        words = self._normalize(name).split()
+        return [" ".join(words[i:]) for i in range(len(words))]
+
+    def _short_prefixes(self, suffixes: Iterable[str]) -> Set[str]:
+        return {
+            suffix[:length]
+            for suffix in suffixes
+            for length in range(1, min(len(suffix), self.top_prefix_length) + 1)
+        }
+
+    def _long_prefixes(self, suffixes: Iterable[str]) -> Set[str]:
+        return {
+            suffix[:length]
+            for suffix in suffixes
+            for length in range(self.top_prefix_length + 1, len(suffix) + 1)
+        }
+
+    def _rank(self, entries: Dict[str, dict], entry_keys: Iterable[str], limit: int) -> List[str]:
+        """Categories first, then products, each ordered by popularity"""
+        return heapq.nsmallest(
+            limit,
+            entry_keys,
+            key=lambda entry_key: (
+                entries[entry_key]["type"] != "category", -entries[entry_key]["score"],
+                entries[entry_key]["name"], entry_key
+            )
+        )
+
+    def _matches(self, prefix: str) -> Set[str]:
+        """Every entry with a word starting with ``prefix``"""
+        matches = set()
+        index = bisect.bisect_left(self._keys, (prefix, ""))
+        while index < len(self._keys) and self._keys[index][0].startswith(prefix):
+            matches.add(self._keys[index][1])
+            index += 1
+        return matches
+
+    def _refresh(self, entry_key: str, removed: List[str], added: List[str]):
+        """Update the ranked lists after ``entry_key`` was removed and/or
+        re-added with the given suffixes"""
+        for prefix in self._long_prefixes(removed + added):
+            self._ranked.pop(prefix, None)
+
+        added_prefixes = self._short_prefixes(added)
+        for prefix in self._short_prefixes(removed) | added_prefixes:
+            top = self._top.get(prefix, [])
+            if entry_key in top:
+                # It may have dropped out or down: rank every match again
+                ranked = self._rank(self._entries, self._matches(prefix), self.top_size)
+            elif prefix in added_prefixes:
+                # Only the new entry can displace the current top
+                ranked = self._rank(self._entries, top + [entry_key], self.top_size)
+            else:
+                continue
+            if ranked:
+                self._top[prefix] = ranked
+            else:
+                self._top.pop(prefix, None)
+
+    def _ranked_for(self, prefix: str) -> List[str]:
+        """Top ``top_size`` entries for a prefix longer than top_prefix_length"""
+        ranked = self._ranked.get(prefix)
+        if ranked is None:
+            ranked = self._rank(self._entries, self._matches(prefix), self.top_size)
+            self._ranked[prefix] = ranked
+            if len(self._ranked) > self.ranked_cache_size:
+                self._ranked.popitem(last=False)
+        else:
+            self._ranked.move_to_end(prefix)
+        return ranked
+
+    def _product_entry(self, product: Product) -> dict:
+        # Popularity: well-rated products with many reviews first, featured ones boosted
+        score = (product.rating or 0) * math.log1p(product.review_count or 0)
+        if product.is_featured:
+            score += 5
+        return {"type": "product", "id": product.id, "name": product.name, "score": score}
+
+    def _insert(self, entry_key: str, entry: dict) -> List[str]:
+        """Add an entry; returns its suffixes"""
+        self._entries[entry_key] = entry
+        suffixes = self._suffixes(entry["name"])
+        for suffix in suffixes:
+            bisect.insort(self._keys, (suffix, entry_key))
+        return suffixes
+
+    def _remove(self, entry_key: str) -> List[str]:
+        """Drop an entry; returns the suffixes it had"""
+        entry = self._entries.pop(entry_key, None)
+        if entry is None:
+            return []
+        suffixes = self._suffixes(entry["name"])
+        for suffix in suffixes:
+            index = bisect.bisect_left(self._keys, (suffix, entry_key))
+            if index < len(self._keys) and self._keys[index] == (suffix, entry_key):
+                del self._keys[index]
+        return suffixes
+
+    def rebuild(self, db: Session):
+        """Rebuild the whole index from the database"""
+        products = db.query(
+            Product.id, Product.name, Product.rating, Product.review_count, Product.is_featured
+        ).filter(Product.is_active == True).all()
+        categories = db.query(
+            Category.id, Category.name, func.count(Product.id)
+        ).outerjoin(
+            Product, (Product.category_id == Category.id) & (Product.is_active == True)
+        ).filter(Category.is_active == True).group_by(Category.id).all()
+
+        entries = {}
+        for product in products:
+            entries[f"product:{product.id}"] = self._product_entry(product)
+        for category_id, name, product_count in categories:
+            entries[f"category:{category_id}"] = {
+                "type": "category", "id": category_id, "name": name, "score": product_count
+            }
+
+        keys = sorted(
+            (suffix, entry_key)
+            for entry_key, entry in entries.items()
+            for suffix in self._suffixes(entry["name"])
+        )
+
+        by_prefix: Dict[str, Set[str]] = {}
+        for suffix, entry_key in keys:
+            for prefix in self._short_prefixes([suffix]):
+                by_prefix.setdefault(prefix, set()).add(entry_key)
+        top = {
+            prefix: self._rank(entries, entry_keys, self.top_size)
+            for prefix, entry_keys in by_prefix.items()
+        }
+
+        with self._lock:
+            self._keys = keys
+            self._entries = entries
+            self._top = top
+            self._ranked.clear()
+
+    def _rebuild_from_new_session(self):
+        db = SessionLocal()
+        try:
+            self.rebuild(db)
+        finally:
+            db.close()
+
+    async def run_refresh_loop(self, interval_seconds: int):
+        """Build the index, then rebuild it periodically so every worker
+        eventually sees changes made through other workers"""
+        while True:
+            try:
+                await run_in_threadpool(self._rebuild_from_new_session)
+            except Exception as e:
+                print(f"Autocomplete index rebuild failed: {e}")
+            await asyncio.sleep(interval_seconds)
+
+    def upsert_product(self, product: Product):
+        """Refresh one product after it was created or changed. Call it off
+        the event loop: it may rank every match of a short prefix."""
+        entry_key = f"product:{product.id}"
+        with self._lock:
+            removed = self._remove(entry_key)
+            added = self._insert(entry_key, self._product_entry(product)) if product.is_active else []
+            self._refresh(entry_key, removed, added)
+
+    def remove_product(self, product_id):
+        entry_key = f"product:{product_id}"
+        with self._lock:
+            self._refresh(entry_key, self._remove(entry_key), [])
+
+    def suggest(self, prefix: str, limit: int = 8) -> List[dict]:
+        """Categories first, then products, each ordered by popularity"""
+        prefix = self._normalize(prefix)
+        if not prefix:
+            return []
+
+        with self._lock:
+            if limit > self.top_size:
+                ranked = self._rank(self._entries, self._matches(prefix), limit)
+            elif len(prefix) <= self.top_prefix_length:
+                ranked = self._top.get(prefix, [])[:limit]
+            else:
+                ranked = self._ranked_for(prefix)[:limit]
+            entries = [self._entries[entry_key] for entry_key in ranked]
+
+        return [
+            {"type": entry["type"], "id": entry["id"], "name": entry["name"]}
+            for entry in entries
+        ]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+# Global autocomplete service instance
+autocomplete_service = AutocompleteService()
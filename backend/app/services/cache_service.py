@@ -0,0 +1,268 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.config import settings
+
+try:
+    import redis
+except ImportError:  # Redis tier is optional
+    redis = None
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with a per-entry TTL"""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 60):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class CacheService:
+    """Two-tier cache for serialized responses: an in-process LRU backed by an
+    optional shared Redis tier.
+
+    Keys are grouped into namespaces. Every key embeds its namespace's current
+    version, so a whole namespace (e.g. every product listing) can be dropped
+    in O(1) by bumping the version, while single entries are deleted directly.
+    Local versions are kept for at most max_entries namespaces; a forgotten
+    namespace resumes from the highest version ever forgotten, so its
+    versions never go back to one already used.
+    """
+
+    def __init__(
+        self,
+        prefix: str,
+        max_entries: int = 1024,
+        ttl_seconds: int = 60,
+        redis_url: Optional[str] = None,
+        local_tier: bool = True
+    ):
+        self.prefix = prefix
+        self.ttl_seconds = ttl_seconds
+        self.local = LRUCache(max_entries=max_entries, ttl_seconds=ttl_seconds) if local_tier else None
+        self.redis = None
+        self.max_versions = max_entries
+        self._versions: "OrderedDict[str, int]" = OrderedDict()
+        self._version_floor = 0
+        self._versions_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "local_hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "invalidations": 0,
+            "redis_errors": 0
+        }
+
+        if redis_url:
+            if redis is None:
+                print("redis package not installed - cache will be in-process only")
+            else:
+                self.redis = redis.Redis.from_url(
+                    redis_url,
+                    socket_timeout=0.25,
+                    socket_connect_timeout=0.25
+                )
+
+    def _count(self, stat: str):
+        with self._stats_lock:
+            self.stats[stat] += 1
+
+    def _redis_call(self, method: str, *args, **kwargs):
+        """Call Redis, degrading to the local tier if it is unreachable"""
+        if self.redis is None:
+            return None
+        try:
+            return getattr(self.redis, method)(*args, **kwargs)
+        except redis.RedisError as e:
+            print(f"Cache Redis error ({method}): {e}")
+            self._count("redis_errors")
+            return None
+
+    def version(self, namespace: str) -> int:
+        version = self._redis_call("get", f"{self.prefix}:version:{namespace}")
+        if version is not None:
+            return int(version)
+        with self._versions_lock:
+            return self._versions.get(namespace, self._version_floor)
+
+    def _set_version(self, namespace: str, version: int):
+        # Caller holds _versions_lock
+        self._versions[namespace] = version
+        self._versions.move_to_end(namespace)
+        while len(self._versions) > self.max_versions:
+            _, forgotten = self._versions.popitem(last=False)
+            self._version_floor = max(self._version_floor, forgotten)
+
+    def key(self, namespace: str, **params) -> str:
+        """Build a normalized cache key for ``namespace`` and request parameters"""
+        normalized = json.dumps(params, sort_keys=True, default=str, separators=(",", ":"))
+        return f"{self.prefix}:{namespace}:v{self.version(namespace)}:{normalized}"
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.local.get(key) if self.local else None
+        if value is not None:
+            self._count("local_hits")
+            return value
+
+        value = self._redis_call("get", key)
+        if value is not None:
+            value = value.decode() if isinstance(value, bytes) else value
+            if self.local:
+                self.local.set(key, value)
+            self._count("redis_hits")
+            return value
+
+        self._count("misses")
+        return None
+
+    def set(self, key: str, value: str, ttl_seconds: Optional[int] = None):
+        ttl = ttl_seconds or self.ttl_seconds
+        if self.local:
+            self.local.set(key, value, ttl)
+        self._redis_call("set", key, value, ex=ttl)
+        self._count("sets")
+
+    def delete(self, *keys: str):
+        """Drop specific keys from both tiers"""
+        if self.local:
+            for key in keys:
+                self.local.delete(key)
+        if keys:
+            self._redis_call("delete", *keys)
+        self._count("invalidations")
+
+    def clear(self):
+        """Empty the local tier. Redis entries are left to expire."""
+        if self.local:
+            self.local.clear()
+
+    def invalidate_namespace(self, namespace: str):
+        """Orphan every key in ``namespace`` by bumping its version"""
+        with self._versions_lock:
+            self._set_version(namespace, self._versions.get(namespace, self._version_floor) + 1)
+        version = self._redis_call("incr", f"{self.prefix}:version:{namespace}")
+        if version is not None:
+            with self._versions_lock:
+                self._set_version(namespace, int(version))
+        self._count("invalidations")
+
+    def metrics(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size"""
+        with self._stats_lock:
+            stats = dict(self.stats)
+        hits = stats["local_hits"] + stats["redis_hits"]
+        lookups = hits + stats["misses"]
+        return {
+            **stats,
+            "hits": hits,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "local_entries": len(self.local) if self.local else 0,
+            "redis_enabled": self.redis is not None
+        }
+
+# Global catalog cache instance
+catalog_cache = CacheService(
+    prefix="catalog",
+    max_entries=settings.catalog_cache_max_entries,
+    ttl_seconds=settings.catalog_cache_ttl_seconds,
+    redis_url=settings.redis_url if settings.catalog_cache_use_redis else None
+)
+
+def product_cache_key(product_id) -> str:
+    """Catalog cache key of a single product. It embeds a per-product version,
+    so invalidating it orphans the entry in every worker's local tier (with
+    Redis), not just the one handling the write."""
+    return catalog_cache.key(
+        "product", product_id=product_id, version=catalog_cache.version(f"product:{product_id}")
+    )
+
+def invalidate_product_cache(product_id=None):
+    """Drop cached entries affected by a product write: the product itself
+    and every listing (which embed its price, stock, rating...)"""
+    invalidate_products_cache([product_id] if product_id else [])
+
+def invalidate_products_cache(product_ids: Iterable):
+    """invalidate_product_cache() for many products, dropping listings once"""
+    for product_id in product_ids:
+        catalog_cache.invalidate_namespace(f"product:{product_id}")
+    catalog_cache.invalidate_namespace("listings")
+
+CHANGED_PRODUCTS_KEY = "changed_product_ids"
+
+def invalidate_products_after_commit(db: Session, product_ids: Iterable):
+    """Invalidate products written in ``db``'s transaction (e.g. by a stock
+    UPDATE) once it commits, so a concurrent read cannot re-cache old rows"""
+    db.info.setdefault(CHANGED_PRODUCTS_KEY, set()).update(product_ids)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_products(session):
+    product_ids = session.info.pop(CHANGED_PRODUCTS_KEY, None)
+    if product_ids:
+        invalidate_products_cache(product_ids)
+
+@event.listens_for(Session, "after_transaction_end")
+def _forget_changed_products(session, transaction):
+    # Runs after after_commit, so only rolled-back changes are still here
+    if transaction.parent is None:
+        session.info.pop(CHANGED_PRODUCTS_KEY, None)
+
+# Per-user cart item counts, each under a per-user namespace that cart writes
+# invalidate. With Redis the counts and versions live only there, so every
+# worker sees a cart change at once and the short TTL that bounds staleness
+# between in-process caches is not needed.
+cart_count_cache = CacheService(
+    prefix="cart_count",
+    max_entries=settings.cart_count_cache_max_entries,
+    ttl_seconds=(
+        settings.cart_count_cache_redis_ttl_seconds if settings.cart_count_cache_use_redis
+        else settings.cart_count_cache_ttl_seconds
+    ),
+    redis_url=settings.redis_url if settings.cart_count_cache_use_redis else None,
+    local_tier=not settings.cart_count_cache_use_redis
+)
+
+# Authenticated user snapshots, keyed by user id
+user_cache = CacheService(
+    prefix="user",
+    max_entries=settings.user_cache_max_entries,
+    ttl_seconds=settings.user_cache_ttl_seconds,
+    redis_url=settings.redis_url if settings.user_cache_use_redis else None,
+    local_tier=not settings.user_cache_use_redis
+)
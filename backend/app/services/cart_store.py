@@ -0,0 +1,495 @@
+import json
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import and_, event, func, literal_column, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, joinedload
+from app.config import settings
+from app.models import CartItem, Product
+from app.services.cache_service import cart_count_cache
+
+try:
+    import redis
+except ImportError:  # Only needed for CART_BACKEND=redis
+    redis = None
+
+# Add to a cart line (or create it) and refresh the cart's TTL in one atomic
+# step, refusing if the new quantity would exceed ARGV[3]. Returns the
+# stored line JSON, or nil when refused.
+# KEYS[1] cart key; ARGV: product id, quantity, stock, new line JSON, TTL
+ADD_CART_LINE_SCRIPT = """
+local raw = redis.call('hget', KEYS[1], ARGV[1])
+local line
+if raw then
+    line = cjson.decode(raw)
+    line['quantity'] = line['quantity'] + tonumber(ARGV[2])
+else
+    line = cjson.decode(ARGV[4])
+end
+if line['quantity'] > tonumber(ARGV[3]) then
+    return nil
+end
+local encoded = cjson.encode(line)
+redis.call('hset', KEYS[1], ARGV[1], encoded)
+redis.call('expire', KEYS[1], ARGV[5])
+return encoded
+"""
+
+# Apply a batch of cart changes atomically: every target quantity is checked
+# against its stock limit before anything is written, so a batch is applied
+# whole or not at all. Returns the first product id short on stock, or nil
+# once applied.
+# KEYS[1] cart key; ARGV[1] TTL, ARGV[2] created_at for new lines, then per
+# change: product id, mode (add|set), quantity, stock, id for a new line
+APPLY_CART_BATCH_SCRIPT = """
+local changes = {}
+for i = 3, #ARGV, 5 do
+    local raw = redis.call('hget', KEYS[1], ARGV[i])
+    local line = raw and cjson.decode(raw) or nil
+    local target = tonumber(ARGV[i + 2])
+    if ARGV[i + 1] == 'add' and line then
+        target = line['quantity'] + target
+    end
+    if target > tonumber(ARGV[i + 3]) then
+        return ARGV[i]
+    end
+    changes[#changes + 1] = {field = ARGV[i], line = line, target = target, id = ARGV[i + 4]}
+end
+for _, change in ipairs(changes) do
+    if change.target == 0 then
+        redis.call('hdel', KEYS[1], change.field)
+    else
+        local line = change.line or {id = change.id, created_at = ARGV[2]}
+        line['quantity'] = change.target
+        redis.call('hset', KEYS[1], change.field, cjson.encode(line))
+    end
+end
+redis.call('expire', KEYS[1], ARGV[1])
+return nil
+"""
+
+# Change a line's quantity only if that same line (by id) is still in the
+# cart, so an update racing a removal cannot bring the line back. Returns
+# the stored line JSON, or nil if the line is gone.
+# KEYS[1] cart key; ARGV: product id, line id, quantity, TTL
+SET_CART_LINE_SCRIPT = """
+local raw = redis.call('hget', KEYS[1], ARGV[1])
+if not raw then
+    return nil
+end
+local line = cjson.decode(raw)
+if line['id'] ~= ARGV[2] then
+    return nil
+end
+line['quantity'] = tonumber(ARGV[3])
+local encoded = cjson.encode(line)
+redis.call('hset', KEYS[1], ARGV[1], encoded)
+redis.call('expire', KEYS[1], ARGV[4])
+return encoded
+"""
+
+def run_after_commit(db: Session, callback):
+    """Run ``callback`` once the session's current transaction commits"""
+    event.listen(db, "after_commit", lambda session: callback(), once=True)
+
+def check_batch_products(changes: Dict[uuid.UUID, Tuple[str, int]], stock: Dict[uuid.UUID, int]):
+    """Reject a batch that refers to missing or inactive products"""
+    missing = [str(product_id) for product_id in changes if product_id not in stock]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Products not found: {', '.join(missing)}")
+
+def resolve_batch_quantities(
+    changes: Dict[uuid.UUID, Tuple[str, int]],
+    stock: Dict[uuid.UUID, int],
+    existing: Dict[uuid.UUID, int]
+) -> Dict[uuid.UUID, int]:
+    """Final cart quantity per product for a batch of (mode, quantity) changes,
+    rejecting the whole batch if any product is unavailable or short on stock"""
+    check_batch_products(changes, stock)
+
+    targets = {}
+    for product_id, (mode, quantity) in changes.items():
+        target = quantity if mode == "set" else existing.get(product_id, 0) + quantity
+        if target > stock[product_id]:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Not enough stock available for product {product_id}"
+            )
+        targets[product_id] = target
+    return targets
+
+@dataclass
+class CartLine:
+    """A cart item held outside Postgres, shaped like CartItem for responses"""
+    id: uuid.UUID
+    user_id: uuid.UUID
+    product_id: uuid.UUID
+    quantity: int
+    created_at: datetime
+    product: Optional[Product] = None
+
+class DatabaseCartStore:
+    """Carts as rows in cart_items (the original storage)"""
+
+    def _count_key(self, user_id) -> str:
+        # Embeds a per-user version that every cart write bumps, so a sum read
+        # before a write and cached after it is never served
+        return cart_count_cache.key(f"user:{user_id}")
+
+    def _invalidate_count(self, user_id):
+        cart_count_cache.invalidate_namespace(f"user:{user_id}")
+
+    def list_items(self, db: Session, user_id) -> List[CartItem]:
+        return db.query(CartItem).options(
+            joinedload(CartItem.product).joinedload(Product.category)
+        ).filter(CartItem.user_id == user_id).all()
+
+    def get_item(self, db: Session, user_id, item_id) -> Optional[CartItem]:
+        return db.query(CartItem).filter(
+            and_(CartItem.id == item_id, CartItem.user_id == user_id)
+        ).first()
+
+    def _upsert(
+        self,
+        user_id,
+        quantities: Dict[uuid.UUID, int],
+        increment: bool,
+        max_quantity: Optional[int] = None,
+        cap_at_stock: bool = False
+    ):
+        """INSERT ... ON CONFLICT (user_id, product_id) DO UPDATE for many lines at once.
+        With ``max_quantity`` an existing line is left untouched if it would exceed it;
+        with ``cap_at_stock`` it is capped at its product's current stock instead."""
+        stmt = insert(CartItem).values([
+            {"user_id": user_id, "product_id": product_id, "quantity": quantity}
+            for product_id, quantity in quantities.items()
+        ])
+        new_quantity = CartItem.quantity + stmt.excluded.quantity if increment else stmt.excluded.quantity
+        if cap_at_stock:
+            new_quantity = func.least(
+                new_quantity,
+                # A bare column, so the subquery does not list excluded in its FROM
+                select(Product.stock_quantity)
+                .where(Product.id == literal_column("excluded.product_id"))
+                .scalar_subquery()
+            )
+        return stmt.on_conflict_do_update(
+            index_elements=[CartItem.user_id, CartItem.product_id],
+            set_={"quantity": new_quantity, "updated_at": func.now()},
+            where=(new_quantity <= max_quantity) if max_quantity is not None else None
+        )
+
+    def add_item(self, db: Session, user_id, product: Product, quantity: int) -> CartItem:
+        # The stock check rides on the upsert, so concurrent adds can't overshoot it
+        stmt = self._upsert(
+            user_id, {product.id: quantity}, increment=True, max_quantity=product.stock_quantity
+        ).returning(CartItem.id)
+        item_id = db.execute(stmt).scalar()
+        if item_id is None:
+            db.rollback()
+            raise HTTPException(status_code=400, detail="Not enough stock available")
+
+        db.commit()
+        self._invalidate_count(user_id)
+        return db.get(CartItem, item_id)
+
+    def apply_batch(self, db: Session, user_id, changes: Dict[uuid.UUID, Tuple[str, int]]) -> List[CartItem]:
+        """Apply many adds and quantity changes in one transaction"""
+        # Stock and current cart quantities for every product in a single query
+        rows = db.query(Product.id, Product.stock_quantity, CartItem.quantity).outerjoin(
+            CartItem, and_(CartItem.product_id == Product.id, CartItem.user_id == user_id)
+        ).filter(Product.id.in_(list(changes)), Product.is_active == True).all()
+        stock = {product_id: stock_quantity for product_id, stock_quantity, _ in rows}
+        existing = {product_id: quantity for product_id, _, quantity in rows if quantity is not None}
+        targets = resolve_batch_quantities(changes, stock, existing)
+
+        additions = {
+            product_id: quantity for product_id, (mode, quantity) in changes.items()
+            if mode == "add" and quantity > 0
+        }
+        replacements = {
+            product_id: targets[product_id] for product_id, (mode, _) in changes.items()
+            if mode == "set" and targets[product_id] > 0
+        }
+        removals = [product_id for product_id, target in targets.items() if target == 0]
+
+        if additions:
+            # The stock read above is not locked, so a concurrent batch may have
+            # added to the same lines since: cap them in SQL as add_item does
+            db.execute(self._upsert(user_id, additions, increment=True, cap_at_stock=True))
+        if replacements:
+            db.execute(self._upsert(user_id, replacements, increment=False))
+        if removals:
+            db.query(CartItem).filter(
+                and_(CartItem.user_id == user_id, CartItem.product_id.in_(removals))
+            ).delete(synchronize_session=False)
+
+        db.commit()
+        self._invalidate_count(user_id)
+        return self.list_items(db, user_id)
+
+    def set_quantity(self, db: Session, user_id, item: CartItem, quantity: int) -> CartItem:
+        item.quantity = quantity
+        db.commit()
+        self._invalidate_count(user_id)
+        db.refresh(item)
+        return item
+
+    def remove_item(self, db: Session, user_id, item: CartItem):
+        db.delete(item)
+        db.commit()
+        self._invalidate_count(user_id)
+
+    def clear(self, db: Session, user_id):
+        """Empty the cart as part of the caller's transaction (the caller commits)"""
+        db.query(CartItem).filter(CartItem.user_id == user_id).delete()
+        run_after_commit(db, lambda: self._invalidate_count(user_id))
+
+    def count(self, db: Session, user_id) -> int:
+        # The key (and so the version) is read before summing
+        count_key = self._count_key(user_id)
+        cached = cart_count_cache.get(count_key)
+        if cached is not None:
+            return int(cached)
+
+        total_count = db.query(func.coalesce(func.sum(CartItem.quantity), 0)).filter(
+            CartItem.user_id == user_id
+        ).scalar()
+        cart_count_cache.set(count_key, str(total_count))
+        return total_count
+
+class InMemoryHashClient:
+    """Minimal stand-in for the Redis hash commands the cart store uses, so the
+    Redis backend can run in tests and dev without a Redis server"""
+
+    def __init__(self):
+        self._data: Dict[str, Dict[str, str]] = {}
+        self._expires: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key: str) -> Dict[str, str]:
+        if key in self._expires and self._expires[key] < time.monotonic():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return self._data.setdefault(key, {})
+
+    def hgetall(self, key: str) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._live(key))
+
+    def hdel(self, key: str, *fields: str):
+        with self._lock:
+            hash_ = self._live(key)
+            for field in fields:
+                hash_.pop(field, None)
+
+    def delete(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+                self._expires.pop(key, None)
+
+    def eval(self, script: str, numkeys: int, *args):
+        """Run one of the cart store's Lua scripts as the equivalent Python under the lock"""
+        scripts = {
+            ADD_CART_LINE_SCRIPT: self._add_cart_line,
+            APPLY_CART_BATCH_SCRIPT: self._apply_cart_batch,
+            SET_CART_LINE_SCRIPT: self._set_cart_line
+        }
+        if script not in scripts:
+            raise NotImplementedError("InMemoryHashClient only runs the cart store's scripts")
+        with self._lock:
+            return scripts[script](*args)
+
+    def _add_cart_line(self, key, field, quantity, stock, new_line, ttl_seconds):
+        hash_ = self._live(key)
+        if field in hash_:
+            line = json.loads(hash_[field])
+            line["quantity"] += int(quantity)
+        else:
+            line = json.loads(new_line)
+        if line["quantity"] > int(stock):
+            return None
+        hash_[field] = json.dumps(line)
+        self._expires[key] = time.monotonic() + int(ttl_seconds)
+        return hash_[field]
+
+    def _apply_cart_batch(self, key, ttl_seconds, created_at, *changes):
+        hash_ = self._live(key)
+        targets = []
+        for i in range(0, len(changes), 5):
+            field, mode, quantity, stock, new_id = changes[i:i + 5]
+            line = json.loads(hash_[field]) if field in hash_ else None
+            target = int(quantity)
+            if mode == "add" and line:
+                target += line["quantity"]
+            if target > int(stock):
+                return field
+            targets.append((field, line or {"id": new_id, "created_at": created_at}, target))
+
+        for field, line, target in targets:
+            if target == 0:
+                hash_.pop(field, None)
+            else:
+                line["quantity"] = target
+                hash_[field] = json.dumps(line)
+        self._expires[key] = time.monotonic() + int(ttl_seconds)
+        return None
+
+    def _set_cart_line(self, key, field, line_id, quantity, ttl_seconds):
+        hash_ = self._live(key)
+        if field not in hash_:
+            return None
+        line = json.loads(hash_[field])
+        if line["id"] != line_id:
+            return None
+        line["quantity"] = int(quantity)
+        hash_[field] = json.dumps(line)
+        self._expires[key] = time.monotonic() + int(ttl_seconds)
+        return hash_[field]
+
+class RedisCartStore:
+    """Carts as Redis hashes (cart:<user_id> -> {product_id: item JSON}) with a
+    sliding TTL. Nothing is written to Postgres until checkout turns the cart
+    into order items."""
+
+    def __init__(self, client, ttl_seconds: int):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+
+    def _key(self, user_id) -> str:
+        return f"cart:{user_id}"
+
+    def _decode(self, value) -> str:
+        return value.decode() if isinstance(value, bytes) else value
+
+    def _lines(self, user_id) -> List[CartLine]:
+        lines = []
+        for product_id, raw in self.client.hgetall(self._key(user_id)).items():
+            data = json.loads(self._decode(raw))
+            lines.append(CartLine(
+                id=uuid.UUID(data["id"]),
+                user_id=user_id,
+                product_id=uuid.UUID(self._decode(product_id)),
+                quantity=data["quantity"],
+                created_at=datetime.fromisoformat(data["created_at"])
+            ))
+        return sorted(lines, key=lambda line: line.created_at)
+
+    def _encode(self, line: CartLine) -> str:
+        return json.dumps({
+            "id": str(line.id),
+            "quantity": line.quantity,
+            "created_at": line.created_at.isoformat()
+        })
+
+    def _attach_products(self, db: Session, lines: List[CartLine]) -> List[CartLine]:
+        """Load every line's product in one query; lines whose product is gone are dropped"""
+        if not lines:
+            return []
+        products = db.query(Product).options(joinedload(Product.category)).filter(
+            Product.id.in_([line.product_id for line in lines])
+        ).all()
+        products_by_id = {product.id: product for product in products}
+        for line in lines:
+            line.product = products_by_id.get(line.product_id)
+        return [line for line in lines if line.product is not None]
+
+    def list_items(self, db: Session, user_id) -> List[CartLine]:
+        return self._attach_products(db, self._lines(user_id))
+
+    def get_item(self, db: Session, user_id, item_id) -> Optional[CartLine]:
+        for line in self._lines(user_id):
+            if line.id == item_id:
+                attached = self._attach_products(db, [line])
+                return attached[0] if attached else None
+        return None
+
+    def add_item(self, db: Session, user_id, product: Product, quantity: int) -> CartLine:
+        # Read, increment, stock check and write run as one script, so
+        # concurrent adds can neither lose an increment nor overshoot stock
+        new_line = CartLine(
+            id=uuid.uuid4(),
+            user_id=user_id,
+            product_id=product.id,
+            quantity=quantity,
+            created_at=datetime.now(timezone.utc)
+        )
+        raw = self.client.eval(
+            ADD_CART_LINE_SCRIPT, 1, self._key(user_id),
+            str(product.id), quantity, product.stock_quantity, self._encode(new_line), self.ttl_seconds
+        )
+        if raw is None:
+            raise HTTPException(status_code=400, detail="Not enough stock available")
+
+        data = json.loads(self._decode(raw))
+        return CartLine(
+            id=uuid.UUID(data["id"]),
+            user_id=user_id,
+            product_id=product.id,
+            quantity=data["quantity"],
+            created_at=datetime.fromisoformat(data["created_at"]),
+            product=product
+        )
+
+    def set_quantity(self, db: Session, user_id, item: CartLine, quantity: int) -> CartLine:
+        raw = self.client.eval(
+            SET_CART_LINE_SCRIPT, 1, self._key(user_id),
+            str(item.product_id), str(item.id), quantity, self.ttl_seconds
+        )
+        if raw is None:
+            raise HTTPException(status_code=404, detail="Cart item not found")
+        item.quantity = quantity
+        return item
+
+    def apply_batch(self, db: Session, user_id, changes: Dict[uuid.UUID, Tuple[str, int]]) -> List[CartLine]:
+        """Apply many adds and quantity changes in one script, so the batch is
+        all-or-nothing and concurrent cart writes cannot interleave with it"""
+        stock = dict(db.query(Product.id, Product.stock_quantity).filter(
+            Product.id.in_(list(changes)), Product.is_active == True
+        ).all())
+        check_batch_products(changes, stock)
+
+        args = []
+        for product_id, (mode, quantity) in changes.items():
+            args += [str(product_id), mode, quantity, stock[product_id], str(uuid.uuid4())]
+        short = self.client.eval(
+            APPLY_CART_BATCH_SCRIPT, 1, self._key(user_id),
+            self.ttl_seconds, datetime.now(timezone.utc).isoformat(), *args
+        )
+        if short is not None:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Not enough stock available for product {self._decode(short)}"
+            )
+
+        return self.list_items(db, user_id)
+
+    def remove_item(self, db: Session, user_id, item: CartLine):
+        self.client.hdel(self._key(user_id), str(item.product_id))
+
+    def clear(self, db: Session, user_id):
+        """Empty the cart once the caller's transaction commits, so a failed
+        checkout leaves the cart intact"""
+        run_after_commit(db, lambda: self.client.delete(self._key(user_id)))
+
+    def count(self, db: Session, user_id) -> int:
+        return sum(line.quantity for line in self._lines(user_id))
+
+def create_cart_store():
+    """Build the cart store selected by settings.cart_backend"""
+    if settings.cart_backend == "redis":
+        if redis is None:
+            raise RuntimeError("CART_BACKEND=redis requires the redis package")
+        return RedisCartStore(redis.Redis.from_url(settings.redis_url), settings.cart_ttl_seconds)
+    if settings.cart_backend == "memory":
+        return RedisCartStore(InMemoryHashClient(), settings.cart_ttl_seconds)
+    return DatabaseCartStore()
+
+# Global cart store instance
+cart_store = create_cart_store()
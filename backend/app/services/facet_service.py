@@ -0,0 +1,86 @@
+from typing import Any, Dict, List
+from sqlalchemy import case, func, literal_column
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import Product
+
+# Upper bounds of the price-range facet buckets; the last bucket is open-ended
+PRICE_BUCKET_EDGES = [50, 100, 250, 500, 1000, 2500]
+
+class FacetService:
+    """Computes category, price-range and availability facet counts for a
+    filtered product query in a single GROUPING SETS query"""
+
+    def __init__(self, price_bucket_edges: List[int] = PRICE_BUCKET_EDGES):
+        self.price_bucket_edges = price_bucket_edges
+
+    def _price_bucket(self):
+        # Inlined literals keep the expression textually identical in SELECT,
+        # GROUPING() and GROUP BY, which Postgres requires
+        effective_price = func.coalesce(Product.discount_price, Product.price)
+        return case(
+            *[
+                (effective_price < literal_column(str(upper)), literal_column(str(index)))
+                for index, upper in enumerate(self.price_bucket_edges)
+            ],
+            else_=literal_column(str(len(self.price_bucket_edges)))
+        )
+
+    def _bucket_bounds(self, bucket: int) -> Dict[str, Any]:
+        lower = self.price_bucket_edges[bucket - 1] if bucket > 0 else 0
+        upper = self.price_bucket_edges[bucket] if bucket < len(self.price_bucket_edges) else None
+        label = f"{lower}-{upper}" if upper is not None else f"{lower}+"
+        return {"label": label, "min": lower, "max": upper}
+
+    def _columns_and_grouping(self):
+        price_bucket = self._price_bucket().label("price_bucket")
+        in_stock = (Product.stock_quantity > literal_column("0")).label("in_stock")
+        columns = [
+            Product.category_id,
+            price_bucket,
+            in_stock,
+            func.grouping(Product.category_id).label("by_category"),
+            func.grouping(price_bucket).label("by_price"),
+            func.count().label("count")
+        ]
+        return columns, func.grouping_sets(Product.category_id, price_bucket, in_stock)
+
+    def compute(self, query) -> Dict[str, Any]:
+        """Facet counts over every row ``query`` matches (ignoring pagination)"""
+        columns, grouping = self._columns_and_grouping()
+        return self._summarize(query.with_entities(*columns).group_by(grouping).all())
+
+    def statement(self, stmt):
+        """The facet query for a filtered select(Product)"""
+        columns, grouping = self._columns_and_grouping()
+        return stmt.with_only_columns(*columns).group_by(grouping)
+
+    async def compute_async(self, db: AsyncSession, stmt) -> Dict[str, Any]:
+        """compute() for a select() run on an AsyncSession"""
+        result = await db.execute(self.statement(stmt))
+        return self._summarize(result.all())
+
+    def _summarize(self, rows) -> Dict[str, Any]:
+        categories = []
+        price_ranges = {}
+        availability = {"in_stock": 0, "out_of_stock": 0}
+        for row in rows:
+            # grouping() is 0 for the column the row is grouped by
+            if row.by_category == 0:
+                categories.append({"category_id": row.category_id, "count": row.count})
+            elif row.by_price == 0:
+                price_ranges[row.price_bucket] = row.count
+            else:
+                availability["in_stock" if row.in_stock else "out_of_stock"] += row.count
+
+        categories.sort(key=lambda facet: facet["count"], reverse=True)
+        return {
+            "categories": categories,
+            "price_ranges": [
+                {**self._bucket_bounds(bucket), "count": price_ranges.get(bucket, 0)}
+                for bucket in range(len(self.price_bucket_edges) + 1)
+            ],
+            "availability": availability
+        }
+
+# Global facet service instance
+facet_service = FacetService()
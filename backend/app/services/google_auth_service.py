@@ -0,0 +1,95 @@
+import asyncio
+import base64
+import json
+import re
+import threading
+import time
+from typing import Dict, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from fastapi.concurrency import run_in_threadpool
+from google.auth import jwt as google_jwt
+
+GOOGLE_CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+
+class GoogleAuthService:
+    """Verifies Google ID tokens against an in-process copy of Google's
+    signing certificates.
+
+    The certificates are fetched over a pooled requests.Session and kept for
+    as long as Google's Cache-Control max-age allows. A background loop
+    refreshes them shortly before they expire, so sign-ins normally never
+    wait on the fetch. A token signed with an unknown key id triggers an
+    early refresh (at most once per min_refetch_seconds) to pick up a rotation.
+    """
+
+    def __init__(self, default_max_age: int = 3600, min_refetch_seconds: int = 60):
+        self.default_max_age = default_max_age
+        self.min_refetch_seconds = min_refetch_seconds
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=4, max_retries=2))
+        self._certs: Dict[str, str] = {}
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    def _max_age(self, cache_control: str) -> int:
+        match = re.search(r"max-age=(\d+)", cache_control or "")
+        return int(match.group(1)) if match else self.default_max_age
+
+    def _fetch(self):
+        response = self.session.get(GOOGLE_CERTS_URL, timeout=5)
+        response.raise_for_status()
+        self._certs = response.json()
+        self._fetched_at = time.monotonic()
+        self._expires_at = self._fetched_at + self._max_age(response.headers.get("Cache-Control"))
+
+    def get_certs(self, force: bool = False) -> Dict[str, str]:
+        """Current certificates, fetched if expired (or if ``force`` and the
+        last fetch is older than min_refetch_seconds)"""
+        now = time.monotonic()
+        if now < self._expires_at and not (force and now - self._fetched_at > self.min_refetch_seconds):
+            return self._certs
+        with self._lock:
+            # Another thread may have refreshed while we waited
+            now = time.monotonic()
+            if now >= self._expires_at or (force and now - self._fetched_at > self.min_refetch_seconds):
+                self._fetch()
+            return self._certs
+
+    def _key_id(self, token: str) -> Optional[str]:
+        try:
+            header = token.split(".", 1)[0]
+            return json.loads(base64.urlsafe_b64decode(header + "=" * (-len(header) % 4))).get("kid")
+        except (ValueError, AttributeError):
+            return None
+
+    def verify(self, token: str, audience: str) -> dict:
+        """Verify a Google ID token and return its claims. Raises ValueError
+        if the token is invalid. Blocking - call verify_async from handlers."""
+        certs = self.get_certs()
+        if self._key_id(token) not in certs:
+            certs = self.get_certs(force=True)
+
+        claims = google_jwt.decode(token, certs=certs, audience=audience, clock_skew_in_seconds=10)
+        if claims.get("iss") not in GOOGLE_ISSUERS:
+            raise ValueError("Wrong issuer.")
+        return claims
+
+    async def verify_async(self, token: str, audience: str) -> dict:
+        """verify() off the event loop"""
+        return await run_in_threadpool(self.verify, token, audience)
+
+    async def run_refresh_loop(self, margin_seconds: int = 60):
+        """Refresh the certificates shortly before they expire"""
+        while True:
+            try:
+                await run_in_threadpool(self.get_certs, True)
+            except Exception as e:
+                print(f"Google certificate refresh failed: {e}")
+            delay = self._expires_at - time.monotonic() - margin_seconds
+            await asyncio.sleep(max(delay, self.min_refetch_seconds))
+
+# Global Google auth service instance
+google_auth_service = GoogleAuthService()
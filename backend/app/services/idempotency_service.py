@@ -0,0 +1,174 @@
+import asyncio
+import hashlib
+import inspect
+import time
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Optional, Union
+from fastapi import HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
+from pydantic import TypeAdapter
+from sqlalchemy import and_, or_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.sql import func
+from app.config import settings
+from app.database import SessionLocal
+from app.models import IdempotencyKey
+
+# Request header clients send to make a POST safe to retry
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+
+class IdempotencyService:
+    """Stores the first response for each (user, Idempotency-Key) in Postgres
+    and replays it for retries without running the handler again.
+
+    A key is claimed with a single INSERT ... ON CONFLICT before the handler
+    runs, so of two concurrent duplicates only one runs; the other polls
+    until the first response is stored. Keys are written on their own
+    session so the claim is visible to other workers straight away,
+    independent of the request's transaction. Those sessions are sync, so
+    every key query runs on the thread pool rather than the event loop.
+    """
+
+    def __init__(self, poll_interval: float = 0.1):
+        self.poll_interval = poll_interval
+
+    def _request_hash(self, request_path: str, request_body: str) -> str:
+        return hashlib.sha256(f"{request_path}\n{request_body}".encode()).hexdigest()
+
+    def _claim(self, user_id, key: str, request_path: str, request_hash: str) -> bool:
+        """Claim the key, taking over expired completed keys and abandoned
+        in-progress ones. Returns False if someone else holds it."""
+        now = func.now()
+        stmt = insert(IdempotencyKey).values(
+            user_id=user_id,
+            key=key,
+            request_path=request_path,
+            request_hash=request_hash,
+            status="in_progress"
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[IdempotencyKey.user_id, IdempotencyKey.key],
+            set_={
+                "request_path": stmt.excluded.request_path,
+                "request_hash": stmt.excluded.request_hash,
+                "status": "in_progress",
+                "response_status": None,
+                "response_body": None,
+                "created_at": now
+            },
+            where=or_(
+                and_(
+                    IdempotencyKey.status == "completed",
+                    IdempotencyKey.created_at < now - timedelta(seconds=settings.idempotency_key_ttl_seconds)
+                ),
+                and_(
+                    IdempotencyKey.status == "in_progress",
+                    IdempotencyKey.created_at < now - timedelta(seconds=settings.idempotency_lock_timeout_seconds)
+                )
+            )
+        ).returning(IdempotencyKey.id)
+
+        db = SessionLocal()
+        try:
+            claimed = db.execute(stmt).first() is not None
+            db.commit()
+            return claimed
+        finally:
+            db.close()
+
+    def _lookup(self, user_id, key: str) -> Optional[IdempotencyKey]:
+        db = SessionLocal()
+        try:
+            return db.query(IdempotencyKey).filter(
+                and_(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+            ).first()
+        finally:
+            db.close()
+
+    def _complete(self, user_id, key: str, status_code: int, body: str):
+        db = SessionLocal()
+        try:
+            db.query(IdempotencyKey).filter(
+                and_(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+            ).update(
+                {"status": "completed", "response_status": status_code, "response_body": body},
+                synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _release(self, user_id, key: str):
+        """Drop a claim whose handler failed, so a retry runs it again"""
+        db = SessionLocal()
+        try:
+            db.query(IdempotencyKey).filter(
+                and_(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _replay(self, record: IdempotencyKey) -> Response:
+        return Response(
+            content=record.response_body,
+            status_code=record.response_status,
+            media_type="application/json",
+            headers={"Idempotent-Replayed": "true"}
+        )
+
+    async def run(
+        self,
+        key: Optional[str],
+        user_id,
+        request_path: str,
+        request_body: str,
+        handler: Callable[[], Union[Any, Awaitable[Any]]],
+        adapter: TypeAdapter
+    ):
+        """Run ``handler`` once per key and return its result serialized with
+        ``adapter``. Without a key the handler simply runs."""
+        if not key:
+            return await self._call(handler)
+
+        if len(key) > 255:
+            raise HTTPException(status_code=400, detail=f"{IDEMPOTENCY_KEY_HEADER} is too long")
+
+        request_hash = self._request_hash(request_path, request_body)
+        deadline = time.monotonic() + settings.idempotency_wait_seconds
+        while not await run_in_threadpool(self._claim, user_id, key, request_path, request_hash):
+            record = await run_in_threadpool(self._lookup, user_id, key)
+            if record is not None:
+                if record.request_hash != request_hash:
+                    raise HTTPException(
+                        status_code=422,
+                        detail=f"{IDEMPOTENCY_KEY_HEADER} was already used for a different request"
+                    )
+                if record.status == "completed":
+                    return self._replay(record)
+            if time.monotonic() > deadline:
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"A request with this {IDEMPOTENCY_KEY_HEADER} is still in progress"
+                )
+            await asyncio.sleep(self.poll_interval)
+
+        try:
+            result = await self._call(handler)
+        except BaseException:
+            await run_in_threadpool(self._release, user_id, key)
+            raise
+
+        body = adapter.dump_json(adapter.validate_python(result))
+        await run_in_threadpool(self._complete, user_id, key, 200, body.decode())
+        return Response(content=body, media_type="application/json")
+
+    async def _call(self, handler: Callable[[], Union[Any, Awaitable[Any]]]):
+        """Run a sync handler on the thread pool, or await an async one"""
+        if inspect.iscoroutinefunction(handler):
+            return await handler()
+        result = await run_in_threadpool(handler)
+        return await result if inspect.isawaitable(result) else result
+
+# Global idempotency service instance
+idempotency_service = IdempotencyService()
@@ -0,0 +1,75 @@
+from decimal import Decimal
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from fastapi import HTTPException
+from app.models import Order, OrderItem, User
+from app.schemas import OrderCreate
+from app.services.cart_store import cart_store
+from app.services.reservation_service import reservation_service
+
+class OrderService:
+    """Checkout: turns a cart into an order in a single transaction, holding
+    its stock until the order is paid or the hold expires"""
+
+    def create_from_cart(self, db: Session, user: User, order_data: OrderCreate) -> Order:
+        """Create the order and its items, clear the cart and reserve the
+        stock, committing once. Nothing is written if any line is short on stock."""
+        cart_items = cart_store.list_items(db, user.id)
+        if not cart_items:
+            raise HTTPException(status_code=400, detail="Cart is empty")
+
+        quantities = {}
+        names = {}
+        for cart_item in cart_items:
+            quantities[cart_item.product_id] = quantities.get(cart_item.product_id, 0) + cart_item.quantity
+            names[cart_item.product_id] = cart_item.product.name
+
+        prices = {
+            cart_item.product_id: cart_item.product.discount_price or cart_item.product.price
+            for cart_item in cart_items
+        }
+        total_amount = sum(
+            (prices[product_id] * quantity for product_id, quantity in quantities.items()),
+            Decimal('0')
+        )
+
+        order = Order(
+            user_id=user.id,
+            total_amount=total_amount,
+            status="pending",
+            payment_method=order_data.payment_method,
+            payment_status="pending",
+            shipping_address=order_data.shipping_address,
+            billing_address=order_data.billing_address
+        )
+        db.add(order)
+        db.flush()
+
+        # Batched into a single multi-row INSERT
+        db.execute(insert(OrderItem), [
+            {
+                "order_id": order.id,
+                "product_id": product_id,
+                "quantity": quantity,
+                "price": prices[product_id]
+            }
+            for product_id, quantity in quantities.items()
+        ])
+
+        cart_store.clear(db, user.id)
+
+        # Reserving stock locks the product rows, so it goes last: the locks
+        # are held only for the reservation statements and the commit
+        short = reservation_service.hold(db, order.id, quantities)
+        if short:
+            db.rollback()
+            raise HTTPException(
+                status_code=400,
+                detail=f"Not enough stock for {names[short[0]]}"
+            )
+
+        db.commit()
+        return order
+
+# Global order service instance
+order_service = OrderService()
@@ -0,0 +1,266 @@
+import asyncio
+import threading
+import uuid
+from typing import Any, Dict, List, Tuple
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, case, or_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Order, PaymentEvent
+from app.services.reservation_service import reservation_service
+
+# Stripe event types that change an order
+HANDLED_EVENT_TYPES = ("payment_intent.succeeded", "payment_intent.payment_failed")
+
+class PaymentEventService:
+    """Applies verified Stripe webhook events to orders off the request path.
+
+    The webhook endpoint stores each event in payment_events before Stripe
+    gets its 200, so nothing acknowledged is lost to a restart. A worker in
+    every process claims pending rows in batches (FOR UPDATE SKIP LOCKED, so
+    workers never share a row) and applies each batch with a few set-based
+    conditional UPDATEs, so duplicate or out-of-order deliveries are
+    harmless. When a batch fails its events are applied one at a time, so
+    only the failing event is retried with backoff; events that keep failing
+    end up in the "dead" status for inspection.
+    """
+
+    def __init__(self, batch_size: int, batch_wait_seconds: float, poll_seconds: float, max_attempts: int):
+        self.batch_size = batch_size
+        self.batch_wait_seconds = batch_wait_seconds
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+        self._wakeup = asyncio.Event()
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "received": 0,
+            "duplicates": 0,
+            "ignored": 0,
+            "batches": 0,
+            "orders_paid": 0,
+            "orders_failed": 0,
+            "refunds_due": 0,
+            "failed_batches": 0,
+            "failed_events": 0,
+            "dead_lettered": 0
+        }
+
+    def _count(self, stat: str, amount: int = 1):
+        with self._stats_lock:
+            self.stats[stat] += amount
+
+    def record(self, db: Session, event):
+        """Durably store a verified event before it is acknowledged to Stripe.
+        Redeliveries of a stored event are ignored."""
+        if event["type"] not in HANDLED_EVENT_TYPES:
+            self._count("ignored")
+            return
+
+        intent = event["data"]["object"]
+        metadata = intent.get("metadata") or {}
+        try:
+            order_id = uuid.UUID(metadata["order_id"])
+        except (KeyError, ValueError):
+            order_id = None  # Matched by payment_intent_id only
+
+        stored = db.execute(
+            insert(PaymentEvent).values(
+                event_id=event["id"],
+                event_type=event["type"],
+                payment_intent_id=intent["id"],
+                order_id=order_id
+            ).on_conflict_do_nothing(index_elements=[PaymentEvent.event_id]).returning(PaymentEvent.id)
+        ).first()
+        db.commit()
+
+        self._count("received" if stored else "duplicates")
+        self._wakeup.set()
+
+    def apply_batch(self, db: Session, events: List[Tuple[str, str, str, Any]]) -> Dict[str, int]:
+        """Apply a batch of (event id, type, intent id, order id) events (the caller commits)"""
+        succeeded, failed = {}, {}
+        for event_id, event_type, intent_id, order_id in {event[0]: event for event in events}.values():
+            target = succeeded if event_type == "payment_intent.succeeded" else failed
+            target[intent_id] = order_id
+
+        def matching(intents: Dict[str, Any]):
+            order_ids = [order_id for order_id in intents.values() if order_id]
+            return or_(Order.payment_intent_id.in_(list(intents)), Order.id.in_(order_ids))
+
+        paid, refunds = [], []
+        if succeeded:
+            # Cancelled orders already gave their stock back; their events are
+            # flagged refund_due so the payment is refunded by hand
+            cancelled = db.query(Order.id, Order.payment_intent_id).filter(
+                and_(matching(succeeded), Order.status == "cancelled", Order.payment_status != "paid")
+            ).all()
+            if cancelled:
+                cancelled_ids = {order_id for order_id, _ in cancelled}
+                cancelled_intents = {intent_id for _, intent_id in cancelled}
+                refunds = [
+                    event_id for event_id, event_type, intent_id, order_id in events
+                    if event_type == "payment_intent.succeeded"
+                    and (intent_id in cancelled_intents or order_id in cancelled_ids)
+                ]
+                db.execute(
+                    update(PaymentEvent)
+                    .where(PaymentEvent.event_id.in_(refunds))
+                    .values(refund_due=True)
+                    .execution_options(synchronize_session=False)
+                )
+
+            # Orders confirmed by the browser already are skipped
+            paid = db.execute(
+                update(Order)
+                .where(and_(
+                    matching(succeeded),
+                    Order.payment_status != "paid",
+                    Order.status != "cancelled"
+                ))
+                .values(status="confirmed", payment_status="paid")
+                .returning(Order.id)
+                .execution_options(synchronize_session=False)
+            ).scalars().all()
+
+            unavailable = reservation_service.commit_many(db, paid)
+            if unavailable:
+                print(f"Paid orders whose stock reservation expired and is gone: {unavailable}")
+                db.execute(
+                    update(Order)
+                    .where(Order.id.in_(unavailable))
+                    .values(status="backordered")
+                    .execution_options(synchronize_session=False)
+                )
+
+        failed_count = 0
+        if failed:
+            # A later success for the same order wins, never the other way round
+            failed_count = db.execute(
+                update(Order)
+                .where(and_(matching(failed), Order.payment_status == "pending"))
+                .values(payment_status="failed")
+                .execution_options(synchronize_session=False)
+            ).rowcount
+
+        return {"orders_paid": len(paid), "orders_failed": failed_count, "refunds_due": len(refunds)}
+
+    def _apply_claimed(self, db: Session, rows: List[PaymentEvent]):
+        """Apply claimed rows and mark them processed in one commit"""
+        applied = self.apply_batch(
+            db, [(row.event_id, row.event_type, row.payment_intent_id, row.order_id) for row in rows]
+        )
+        db.query(PaymentEvent).filter(PaymentEvent.id.in_([row.id for row in rows])).update(
+            {"status": "processed", "processed_at": func.now()},
+            synchronize_session=False
+        )
+        db.commit()
+
+        self._count("batches")
+        for stat, amount in applied.items():
+            self._count(stat, amount)
+
+    def _claim(self, db: Session, *criteria, limit: int) -> List[PaymentEvent]:
+        return db.query(PaymentEvent).filter(
+            and_(PaymentEvent.status == "pending", *criteria)
+        ).order_by(PaymentEvent.created_at).limit(limit).with_for_update(skip_locked=True).all()
+
+    def process_batch(self, db: Session) -> int:
+        """Claim and apply up to batch_size due events. Returns how many were
+        claimed (0 when there was nothing to do)."""
+        rows = self._claim(db, PaymentEvent.next_attempt_at <= func.now(), limit=self.batch_size)
+        if not rows:
+            db.rollback()
+            return 0
+
+        ids = [row.id for row in rows]
+        try:
+            self._apply_claimed(db, rows)
+        except Exception as e:
+            db.rollback()
+            print(f"Payment event batch of {len(ids)} failed, applying its events one at a time: {e}")
+            self._count("failed_batches")
+            self._process_one_by_one(db, ids)
+        return len(ids)
+
+    def _process_one_by_one(self, db: Session, ids: List):
+        """Apply each event of a failed batch in its own transaction, so only
+        the events that fail on their own are retried or dead-lettered"""
+        for row_id in ids:
+            # The batch's row locks went with its rollback; skip rows another
+            # worker has claimed since
+            rows = self._claim(db, PaymentEvent.id == row_id, limit=1)
+            if not rows:
+                db.rollback()
+                continue
+            try:
+                self._apply_claimed(db, rows)
+            except Exception as e:
+                db.rollback()
+                self._record_failure(db, [row_id], e)
+
+    def _record_failure(self, db: Session, ids: List, error: Exception):
+        """Schedule a retry with exponential backoff, dead-lettering events
+        that used up their attempts"""
+        exhausted = PaymentEvent.attempts + 1 >= self.max_attempts
+        dead = db.execute(
+            update(PaymentEvent)
+            .where(PaymentEvent.id.in_(ids))
+            .values(
+                attempts=PaymentEvent.attempts + 1,
+                last_error=str(error)[:2000],
+                status=case((exhausted, "dead"), else_="pending"),
+                next_attempt_at=func.now() + func.make_interval(0, 0, 0, 0, 0, 0, func.power(2, PaymentEvent.attempts))
+            )
+            .returning(PaymentEvent.event_id, PaymentEvent.status)
+            .execution_options(synchronize_session=False)
+        ).all()
+        db.commit()
+
+        dead = [event_id for event_id, status in dead if status == "dead"]
+        if dead:
+            self._count("dead_lettered", len(dead))
+            print(f"Payment events dead-lettered after {self.max_attempts} attempts: {dead}")
+        self._count("failed_events", len(ids))
+
+    def _process_with_new_session(self) -> int:
+        db = SessionLocal()
+        try:
+            return self.process_batch(db)
+        finally:
+            db.close()
+
+    async def run_worker(self):
+        """Apply stored events as they arrive. Wakes up when this process
+        stores an event, and every poll_seconds for events stored by other
+        workers or due for a retry."""
+        while True:
+            try:
+                claimed = await run_in_threadpool(self._process_with_new_session)
+            except Exception as e:
+                print(f"Payment event worker failed: {e}")
+                claimed = 0
+            if claimed == self.batch_size:
+                continue  # More are probably waiting
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+                # Let a burst of deliveries fill the next batch
+                await asyncio.sleep(self.batch_wait_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def metrics(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self.stats)
+
+# Global payment event service instance
+payment_event_service = PaymentEventService(
+    batch_size=settings.payment_event_batch_size,
+    batch_wait_seconds=settings.payment_event_batch_wait_seconds,
+    poll_seconds=settings.payment_event_poll_seconds,
+    max_attempts=settings.payment_event_max_attempts
+)
@@ -0,0 +1,65 @@
+import csv
+import io
+import json
+from typing import Iterator
+from sqlalchemy import select
+from app.database import SessionLocal
+from app.models import Product, Category
+
+EXPORT_COLUMNS = [
+    Product.id, Product.sku, Product.name, Product.description, Product.price,
+    Product.discount_price, Product.category_id, Category.name.label("category_name"),
+    Product.image_urls, Product.stock_quantity, Product.is_active, Product.is_featured,
+    Product.rating, Product.review_count, Product.created_at, Product.updated_at
+]
+
+class ProductExportService:
+    """Streams the product catalog (joined with categories) as NDJSON or CSV.
+
+    Rows come from a server-side cursor in batches of ``batch_size``, so memory
+    stays flat however large the catalog is and the export is a single pass.
+    """
+
+    def __init__(self, batch_size: int = 1000):
+        self.batch_size = batch_size
+
+    def _format_ndjson(self, rows) -> str:
+        return "".join(json.dumps(row._asdict(), default=str) + "\n" for row in rows)
+
+    def _format_csv(self, rows, header: bool = False) -> str:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if header:
+            writer.writerow([column.key for column in EXPORT_COLUMNS])
+        for row in rows:
+            values = row._asdict()
+            # Same pipe-separated convention the CSV import reads
+            values["image_urls"] = "|".join(values["image_urls"] or [])
+            writer.writerow(values.values())
+        return buffer.getvalue()
+
+    def stream(self, fmt: str, include_inactive: bool = False) -> Iterator[str]:
+        """Yield the export in chunks, one chunk per cursor batch"""
+        # The export outlives the request's dependency-scoped session, so it owns its own
+        db = SessionLocal()
+        try:
+            stmt = select(*EXPORT_COLUMNS).outerjoin(Category, Product.category_id == Category.id)
+            if not include_inactive:
+                stmt = stmt.where(Product.is_active == True)
+            stmt = stmt.execution_options(yield_per=self.batch_size)
+
+            first = True
+            for rows in db.execute(stmt).partitions():
+                if fmt == "csv":
+                    yield self._format_csv(rows, header=first)
+                else:
+                    yield self._format_ndjson(rows)
+                first = False
+
+            if fmt == "csv" and first:
+                yield self._format_csv([], header=True)
+        finally:
+            db.close()
+
+# Global product export service instance
+product_export_service = ProductExportService()
@@ -0,0 +1,148 @@
+import csv
+import io
+import json
+import tempfile
+from typing import Any, BinaryIO, Dict, Iterator, List, Tuple
+from pydantic import ValidationError
+from sqlalchemy import literal_column
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models import Product
+from app.schemas import ProductCreate
+
+# Request bodies up to this size stay in memory, larger ones spill to disk
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+# Columns refreshed when an imported SKU already exists
+UPSERT_COLUMNS = [
+    "name", "description", "price", "discount_price", "category_id",
+    "image_urls", "stock_quantity", "is_active", "is_featured"
+]
+
+class ProductImportService:
+    """Bulk product import from CSV or NDJSON, keyed on SKU.
+
+    Rows are validated against ProductCreate and written with one multi-row
+    INSERT ... ON CONFLICT (sku) DO UPDATE per chunk, so memory use depends on
+    the chunk size rather than the size of the feed.
+    """
+
+    def __init__(self, chunk_size: int = 1000, max_reported_errors: int = 1000):
+        self.chunk_size = chunk_size
+        self.max_reported_errors = max_reported_errors
+
+    def spool(self) -> BinaryIO:
+        """Temporary file used to buffer a streamed upload"""
+        return tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+
+    def _csv_records(self, text: io.TextIOBase) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        reader = csv.DictReader(text)
+        for row in reader:
+            record = {key: value for key, value in row.items() if key and value not in (None, "")}
+            # Multiple image URLs are pipe-separated in CSV feeds
+            if "image_urls" in record:
+                record["image_urls"] = [url for url in record["image_urls"].split("|") if url]
+            yield reader.line_num, record
+
+    def _ndjson_records(self, text: io.TextIOBase) -> Iterator[Tuple[int, Any]]:
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, ValueError(f"Invalid JSON: {e}")
+
+    def _validate(self, record: Any) -> Dict[str, Any]:
+        if isinstance(record, Exception):
+            raise record
+        if not isinstance(record, dict):
+            raise ValueError("Row must be an object")
+        product = ProductCreate.model_validate(record)
+        if not product.sku:
+            raise ValueError("sku is required for import")
+        return product.model_dump()
+
+    def _upsert(self, db: Session, rows: List[Dict[str, Any]]) -> Tuple[int, int]:
+        """Write one chunk and return (created, updated)"""
+        stmt = insert(Product).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Product.sku],
+            set_={column: stmt.excluded[column] for column in UPSERT_COLUMNS}
+        ).returning(literal_column("(xmax = 0)"))
+        inserted_flags = db.execute(stmt).scalars().all()
+        created = sum(1 for inserted in inserted_flags if inserted)
+        return created, len(inserted_flags) - created
+
+    def _flush(self, db: Session, chunk: Dict[str, Tuple[int, Dict[str, Any]]], result: Dict[str, Any]):
+        if not chunk:
+            return
+        try:
+            created, updated = self._upsert(db, [row for _, row in chunk.values()])
+            db.commit()
+        except SQLAlchemyError:
+            # Retry row by row so one bad row (e.g. unknown category) doesn't sink the chunk
+            db.rollback()
+            created = updated = 0
+            for line_number, row in chunk.values():
+                try:
+                    with db.begin_nested():
+                        row_created, row_updated = self._upsert(db, [row])
+                    created += row_created
+                    updated += row_updated
+                except SQLAlchemyError as e:
+                    self._record_error(result, line_number, str(getattr(e, "orig", e)).strip())
+            db.commit()
+        result["created"] += created
+        result["updated"] += updated
+
+    def _record_error(self, result: Dict[str, Any], line_number: int, message: str):
+        result["failed"] += 1
+        if len(result["errors"]) < self.max_reported_errors:
+            result["errors"].append({"line": line_number, "error": message})
+
+    def import_file(self, db: Session, upload: BinaryIO, fmt: str) -> Dict[str, Any]:
+        """Import every row of a spooled upload"""
+        upload.seek(0)
+        text = io.TextIOWrapper(upload, encoding="utf-8-sig", newline="")
+        records = self._csv_records(text) if fmt == "csv" else self._ndjson_records(text)
+
+        result = {"processed": 0, "created": 0, "updated": 0, "failed": 0, "errors": []}
+        # Keyed by SKU: a repeated SKU within one chunk keeps its last row
+        chunk: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+
+        last_line = 0
+        try:
+            for line_number, record in records:
+                last_line = line_number
+                result["processed"] += 1
+                try:
+                    row = self._validate(record)
+                except ValidationError as e:
+                    message = "; ".join(
+                        f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+                        for error in e.errors()
+                    )
+                    self._record_error(result, line_number, message)
+                    continue
+                except ValueError as e:
+                    self._record_error(result, line_number, str(e))
+                    continue
+
+                chunk[row["sku"]] = (line_number, row)
+                if len(chunk) >= self.chunk_size:
+                    self._flush(db, chunk, result)
+                    chunk = {}
+        except (UnicodeDecodeError, csv.Error) as e:
+            # The rest of the feed can't be read; keep what was parsed so far
+            # and report where reading stopped alongside the committed counts
+            self._record_error(result, last_line + 1, f"Import stopped, unreadable input: {e}")
+
+        self._flush(db, chunk, result)
+        text.detach()
+        return result
+
+# Global product import service instance
+product_import_service = ProductImportService(chunk_size=settings.product_import_chunk_size)
@@ -0,0 +1,262 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import Integer, and_, column, exists, insert, update, values
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Order, Product, StockReservation
+from app.services.cache_service import invalidate_products_after_commit
+
+class ReservationService:
+    """Stock holds for checkout.
+
+    Placing an order moves stock out of products.stock_quantity into
+    stock_reservations rows that expire after settings.reservation_ttl_seconds.
+    Paying commits the hold, cancelling releases it, and the reaper returns
+    expired holds to stock, so abandoned checkouts never keep stock locked up.
+    Every status change is a conditional UPDATE ... RETURNING, so a hold is
+    restored to stock at most once even with several workers reaping.
+    """
+
+    def _requested(self, quantities: Dict):
+        return values(
+            column("product_id", PG_UUID(as_uuid=True)),
+            column("quantity", Integer),
+            name="requested"
+        ).data(list(quantities.items()))
+
+    def _take_stock(self, db: Session, quantities: Dict) -> List:
+        """Decrement stock for every product in one UPDATE and return the ids
+        of products that did not have enough"""
+        # Lock the rows in a fixed order so concurrent checkouts queue up
+        # instead of deadlocking on each other
+        db.query(Product.id).filter(
+            Product.id.in_(list(quantities))
+        ).order_by(Product.id).with_for_update().all()
+
+        requested = self._requested(quantities)
+        taken = db.execute(
+            update(Product)
+            .where(and_(
+                Product.id == requested.c.product_id,
+                Product.is_active == True,
+                Product.stock_quantity >= requested.c.quantity
+            ))
+            .values(stock_quantity=Product.stock_quantity - requested.c.quantity)
+            .returning(Product.id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+        taken = set(taken)
+        invalidate_products_after_commit(db, taken)
+        return [product_id for product_id in quantities if product_id not in taken]
+
+    def _restore_stock(self, db: Session, rows):
+        """Give (product_id, quantity) rows back to stock in one UPDATE"""
+        quantities = {}
+        for product_id, quantity in rows:
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+        if not quantities:
+            return
+
+        requested = self._requested(quantities)
+        db.execute(
+            update(Product)
+            .where(Product.id == requested.c.product_id)
+            .values(stock_quantity=Product.stock_quantity + requested.c.quantity)
+            .execution_options(synchronize_session=False)
+        )
+        invalidate_products_after_commit(db, quantities)
+
+    def hold(self, db: Session, order_id, quantities: Dict) -> List:
+        """Reserve stock for an order in the caller's transaction.
+
+        Returns the ids of products that are short; the caller must roll back
+        if any are. Call this last before committing - the product row locks
+        are held until the commit.
+        """
+        short = self._take_stock(db, quantities)
+        if short:
+            return short
+
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=settings.reservation_ttl_seconds)
+        db.execute(insert(StockReservation), [
+            {
+                "order_id": order_id,
+                "product_id": product_id,
+                "quantity": quantity,
+                "status": "held",
+                "expires_at": expires_at
+            }
+            for product_id, quantity in quantities.items()
+        ])
+        return []
+
+    def commit(self, db: Session, order_id) -> bool:
+        """Make an order's holds permanent once it is paid (the caller commits).
+
+        If the holds already expired, the stock is taken again. Returns False
+        when it is gone in the meantime, so the caller can backorder the paid
+        order. Raises 409 if the holds were released by a cancellation.
+        """
+        committed = db.execute(
+            update(StockReservation)
+            .where(and_(StockReservation.order_id == order_id, StockReservation.status == "held"))
+            .values(status="committed")
+            .returning(StockReservation.id)
+            .execution_options(synchronize_session=False)
+        ).all()
+        if committed:
+            return True
+
+        outcome = self._commit_unheld(db, order_id)
+        if outcome == "released":
+            db.rollback()
+            raise HTTPException(
+                status_code=409,
+                detail="Order was cancelled and its stock released"
+            )
+        return outcome == "committed"
+
+    def commit_many(self, db: Session, order_ids: List) -> List:
+        """commit() for a batch of paid orders with one UPDATE for the common
+        case. Returns the orders whose stock could not be secured."""
+        if not order_ids:
+            return []
+
+        committed = db.execute(
+            update(StockReservation)
+            .where(and_(StockReservation.order_id.in_(order_ids), StockReservation.status == "held"))
+            .values(status="committed")
+            .returning(StockReservation.order_id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+
+        return [
+            order_id for order_id in set(order_ids) - set(committed)
+            if self._commit_unheld(db, order_id) != "committed"
+        ]
+
+    def _commit_unheld(self, db: Session, order_id) -> str:
+        """Commit a paid order that has no held reservations left.
+
+        Returns "committed", "unavailable" if its expired holds could not be
+        taken again, or "released" if a cancellation returned them to stock.
+        """
+        statuses = {
+            status for status, in db.query(StockReservation.status).filter(
+                StockReservation.order_id == order_id
+            ).distinct()
+        }
+        if "released" in statuses:
+            return "released"
+        if "expired" not in statuses:
+            # Already committed, or placed before reservations existed
+            return "committed"
+
+        # A failed retake has already decremented some products
+        savepoint = db.begin_nested()
+        if not self._retake_expired(db, order_id):
+            savepoint.rollback()
+            return "unavailable"
+        savepoint.commit()
+        return "committed"
+
+    def _retake_expired(self, db: Session, order_id) -> bool:
+        """Take stock again for an order whose holds expired before payment.
+        Returns False if it is no longer available."""
+        # Claim the holds before touching stock: a concurrent commit of the
+        # same order (browser confirm and webhook) blocks here and then finds
+        # nothing left to claim, so the stock is taken once
+        claimed = db.execute(
+            update(StockReservation)
+            .where(and_(StockReservation.order_id == order_id, StockReservation.status == "expired"))
+            .values(status="committed")
+            .returning(StockReservation.product_id, StockReservation.quantity)
+            .execution_options(synchronize_session=False)
+        ).all()
+
+        quantities = {}
+        for product_id, quantity in claimed:
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+        if not quantities:
+            return True
+        return not self._take_stock(db, quantities)
+
+    def release(self, db: Session, order_id) -> bool:
+        """Return an order's held or committed stock (the caller commits).
+
+        Returns False if the order predates reservations and has none.
+        """
+        released = db.execute(
+            update(StockReservation)
+            .where(and_(
+                StockReservation.order_id == order_id,
+                StockReservation.status.in_(["held", "committed"])
+            ))
+            .values(status="released")
+            .returning(StockReservation.product_id, StockReservation.quantity)
+            .execution_options(synchronize_session=False)
+        ).all()
+        if released:
+            self._restore_stock(db, released)
+            return True
+
+        return db.query(exists().where(StockReservation.order_id == order_id)).scalar()
+
+    def reap_expired(self, db: Session) -> int:
+        """Return expired holds to stock and expire their unpaid orders.
+
+        Returns the number of holds reaped.
+        """
+        reaped = db.execute(
+            update(StockReservation)
+            .where(and_(
+                StockReservation.status == "held",
+                StockReservation.expires_at < datetime.now(timezone.utc)
+            ))
+            .values(status="expired")
+            .returning(StockReservation.order_id, StockReservation.product_id, StockReservation.quantity)
+            .execution_options(synchronize_session=False)
+        ).all()
+        if not reaped:
+            db.rollback()
+            return 0
+
+        self._restore_stock(db, [(product_id, quantity) for _, product_id, quantity in reaped])
+        db.execute(
+            update(Order)
+            .where(and_(
+                Order.id.in_(list({order_id for order_id, _, _ in reaped})),
+                Order.status == "pending",
+                Order.payment_status == "pending"
+            ))
+            .values(status="expired")
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        return len(reaped)
+
+    def _reap_with_new_session(self) -> int:
+        db = SessionLocal()
+        try:
+            return self.reap_expired(db)
+        finally:
+            db.close()
+
+    async def run_reaper_loop(self, interval_seconds: int):
+        """Reap expired holds periodically"""
+        while True:
+            try:
+                reaped = await run_in_threadpool(self._reap_with_new_session)
+                if reaped:
+                    print(f"Released {reaped} expired stock reservations")
+            except Exception as e:
+                print(f"Stock reservation reaper failed: {e}")
+            await asyncio.sleep(interval_seconds)
+
+# Global reservation service instance
+reservation_service = ReservationService()
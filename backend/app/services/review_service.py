@@ -0,0 +1,121 @@
+from sqlalchemy import Float, Numeric, and_, cast, exists, func, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from fastapi import HTTPException
+from app.models import Product, Review, Order, OrderItem, User
+from app.schemas import ReviewCreate
+
+class ReviewService:
+    """Keeps Product.rating / review_count / rating_total in step with the
+    reviews table using O(1) arithmetic per review"""
+
+    def add_review(self, db: Session, user: User, review_data: ReviewCreate) -> Review:
+        """Store a review and fold it into the product's aggregates in one transaction"""
+        product_exists = db.query(
+            exists().where(and_(Product.id == review_data.product_id, Product.is_active == True))
+        ).scalar()
+        if not product_exists:
+            raise HTTPException(status_code=404, detail="Product not found")
+
+        verified_purchase = db.query(
+            exists().where(and_(
+                OrderItem.product_id == review_data.product_id,
+                OrderItem.order_id == Order.id,
+                Order.user_id == user.id,
+                Order.payment_status == "paid"
+            ))
+        ).scalar()
+
+        review = Review(
+            user_id=user.id,
+            product_id=review_data.product_id,
+            rating=review_data.rating,
+            comment=review_data.comment,
+            is_verified_purchase=verified_purchase
+        )
+        db.add(review)
+
+        # SET expressions see the pre-update row, so this is a running average
+        db.execute(
+            update(Product)
+            .where(Product.id == review_data.product_id)
+            .values(
+                review_count=Product.review_count + 1,
+                rating_total=Product.rating_total + review_data.rating,
+                rating=(Product.rating_total + review_data.rating) / cast(Product.review_count + 1, Float)
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            raise HTTPException(status_code=400, detail="You have already reviewed this product")
+
+        db.refresh(review)
+        return review
+
+    def reconcile(self, db: Session) -> int:
+        """Repair drifted aggregates from one grouped scan of reviews.
+
+        Returns the number of products corrected.
+        """
+        stats = select(
+            Review.product_id,
+            func.count().label("review_count"),
+            func.sum(Review.rating).label("rating_total")
+        ).group_by(Review.product_id).subquery()
+        # Rounded like the DECIMAL(3,2) column, so correct rows compare equal
+        expected_rating = cast(stats.c.rating_total / cast(stats.c.review_count, Float), Numeric(3, 2))
+
+        # IS DISTINCT FROM so NULL aggregates count as drifted too
+        corrected = db.execute(
+            update(Product)
+            .where(and_(
+                Product.id == stats.c.product_id,
+                or_(
+                    Product.review_count.is_distinct_from(stats.c.review_count),
+                    Product.rating_total.is_distinct_from(stats.c.rating_total),
+                    Product.rating.is_distinct_from(expected_rating)
+                )
+            ))
+            .values(
+                review_count=stats.c.review_count,
+                rating_total=stats.c.rating_total,
+                rating=expected_rating
+            )
+            .execution_options(synchronize_session=False)
+        ).rowcount
+
+        # Products whose reviews are all gone
+        corrected += db.execute(
+            update(Product)
+            .where(and_(
+                or_(
+                    Product.review_count.is_distinct_from(0),
+                    Product.rating_total.is_distinct_from(0),
+                    Product.rating.is_distinct_from(0)
+                ),
+                ~exists().where(Review.product_id == Product.id)
+            ))
+            .values(review_count=0, rating_total=0, rating=0.0)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+
+        db.commit()
+        return corrected
+
+# Global review service instance
+review_service = ReviewService()
+
+
+if __name__ == "__main__":
+    # Batch reconciliation job: python -m app.services.review_service
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        print(f"Reconciled rating aggregates for {review_service.reconcile(db)} products")
+    finally:
+        db.close()
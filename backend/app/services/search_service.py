@@ -0,0 +1,51 @@
+import re
+from typing import Optional
+from sqlalchemy import func, literal, or_, cast
+from sqlalchemy.dialects.postgresql import DOUBLE_PRECISION
+from app.models import Product
+
+# Text search configuration used by the products.search_vector column
+SEARCH_CONFIG = "english"
+
+class SearchService:
+    """Full-text product search backed by the products.search_vector GIN index
+    and a pg_trgm index on products.name for typo tolerance"""
+
+    def __init__(self, config: str = SEARCH_CONFIG):
+        self.config = config
+
+    def build_tsquery(self, term: str) -> Optional[str]:
+        """Turn free text into a prefix-matching tsquery string ("hydr pum" -> "hydr:* & pum:*")"""
+        tokens = re.findall(r"\w+", term.lower())
+        if not tokens:
+            return None
+        return " & ".join(f"{token}:*" for token in tokens)
+
+    def apply(self, query, term: str):
+        """Filter a product query down to matches for ``term``.
+
+        Returns the filtered query together with a relevance expression that
+        callers can order or paginate by (higher is better).
+        """
+        term = term.strip()
+        tsquery_text = self.build_tsquery(term)
+
+        # Trigram word similarity catches misspellings ("hydrolic" -> "Hydraulic")
+        fuzzy_match = literal(term).op("<%")(Product.name)
+        fuzzy_rank = func.word_similarity(term, Product.name)
+
+        if tsquery_text is None:
+            rank = cast(fuzzy_rank, DOUBLE_PRECISION)
+            return query.filter(fuzzy_match), rank
+
+        tsquery = func.to_tsquery(self.config, tsquery_text)
+        text_match = Product.search_vector.op("@@")(tsquery)
+        rank = cast(
+            func.ts_rank_cd(Product.search_vector, tsquery) + fuzzy_rank,
+            DOUBLE_PRECISION
+        )
+
+        return query.filter(or_(text_match, fuzzy_match)), rank
+
+# Global search service instance
+search_service = SearchService()
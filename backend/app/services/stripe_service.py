@@ -1,34 +1,96 @@
+import asyncio
+import functools
+import time
 import stripe
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Dict, Any
 from app.config import settings
+from app.instrumentation import LatencyRegistry
 from fastapi import HTTPException
 from decimal import Decimal
 
 # Initialize Stripe
 stripe.api_key = settings.stripe_secret_key
+if settings.stripe_api_base:
+    # e.g. the offline fake: python fake_stripe.py
+    stripe.api_base = settings.stripe_api_base
+
+# The SDK retries connection errors and retryable responses with jittered
+# exponential backoff, adding an idempotency key to POSTs so a retried
+# create can't run twice
+stripe.max_network_retries = settings.stripe_max_network_retries
+
+# RequestsClient keeps a pooled requests.Session per thread, so connections
+# to Stripe are reused across calls
+stripe.default_http_client = stripe.http_client.RequestsClient(
+    timeout=settings.stripe_request_timeout_seconds
+)
 
 class StripeService:
+    """Async facade over the blocking Stripe SDK.
+
+    Every SDK call runs on a dedicated, bounded thread pool so a slow Stripe
+    response never blocks the event loop, and is abandoned with a 504 after
+    settings.stripe_call_timeout_seconds (retries included).
+    """
+    
     def __init__(self):
         self.stripe = stripe
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.stripe_max_workers,
+            thread_name_prefix="stripe"
+        )
+        self.latency = LatencyRegistry()
+    
+    async def _call(self, operation: str, method, *args, **kwargs):
+        """Run a blocking SDK call on the Stripe thread pool, timed per operation"""
+        loop = asyncio.get_running_loop()
+        stats = self.latency.get(operation)
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(
+                loop.run_in_executor(self._executor, functools.partial(method, *args, **kwargs)),
+                timeout=settings.stripe_call_timeout_seconds
+            )
+        except asyncio.TimeoutError:
+            stats.record(time.perf_counter() - start, "timeout")
+            print(f"Stripe {operation} timed out after {settings.stripe_call_timeout_seconds}s")
+            raise HTTPException(status_code=504, detail="Payment provider timed out")
+        except Exception:
+            stats.record(time.perf_counter() - start, "error")
+            raise
+        stats.record(time.perf_counter() - start)
+        return result
+    
+    def metrics(self) -> Dict[str, Any]:
+        """Per-operation call latency and outcome counts"""
+        return {
+            "max_workers": settings.stripe_max_workers,
+            "operations": self.latency.snapshot()
+        }
     
     async def create_payment_intent(
         self, 
         amount: Decimal, 
         currency: str = "usd",
-        metadata: Optional[Dict[str, Any]] = None
+        metadata: Optional[Dict[str, Any]] = None,
+        idempotency_key: Optional[str] = None
     ) -> Dict[str, Any]:
         """Create a payment intent for checkout"""
         try:
             # Convert Decimal to cents for Stripe
             amount_cents = int(amount * 100)
             
-            intent = self.stripe.PaymentIntent.create(
+            intent = await self._call(
+                "create_payment_intent",
+                self.stripe.PaymentIntent.create,
                 amount=amount_cents,
                 currency=currency,
                 metadata=metadata or {},
                 automatic_payment_methods={
                     'enabled': True,
                 },
+                idempotency_key=idempotency_key,
             )
             
             return {
@@ -41,14 +103,43 @@ class StripeService:
         except stripe.error.StripeError as e:
             print(f"Stripe error: {e}")
             raise HTTPException(status_code=400, detail=f"Payment processing error: {str(e)}")
+        except HTTPException:
+            raise
         except Exception as e:
             print(f"Payment intent creation error: {e}")
             raise HTTPException(status_code=500, detail="Failed to create payment intent")
     
+    async def update_payment_intent(
+        self,
+        payment_intent_id: str,
+        amount: Decimal,
+        currency: str = "usd"
+    ) -> Dict[str, Any]:
+        """Change the amount or currency of an existing payment intent"""
+        try:
+            intent = await self._call(
+                "update_payment_intent",
+                self.stripe.PaymentIntent.modify,
+                payment_intent_id,
+                amount=int(amount * 100),
+                currency=currency,
+            )
+            
+            return {
+                "client_secret": intent.client_secret,
+                "payment_intent_id": intent.id,
+                "amount": amount,
+                "currency": currency
+            }
+            
+        except stripe.error.StripeError as e:
+            print(f"Stripe update error: {e}")
+            raise HTTPException(status_code=400, detail=f"Payment processing error: {str(e)}")
+    
     async def retrieve_payment_intent(self, payment_intent_id: str) -> Dict[str, Any]:
         """Retrieve payment intent details"""
         try:
-            intent = self.stripe.PaymentIntent.retrieve(payment_intent_id)
+            intent = await self._call("retrieve_payment_intent", self.stripe.PaymentIntent.retrieve, payment_intent_id)
             return {
                 "id": intent.id,
                 "status": intent.status,
@@ -70,7 +161,7 @@ class StripeService:
             if amount:
                 refund_data["amount"] = int(amount * 100)  # Convert to cents
             
-            refund = self.stripe.Refund.create(**refund_data)
+            refund = await self._call("create_refund", self.stripe.Refund.create, **refund_data)
             
             return {
                 "id": refund.id,
@@ -93,7 +184,7 @@ class StripeService:
             if name:
                 customer_data["name"] = name
             
-            customer = self.stripe.Customer.create(**customer_data)
+            customer = await self._call("create_customer", self.stripe.Customer.create, **customer_data)
             
             return {
                 "id": customer.id,
@@ -108,7 +199,9 @@ class StripeService:
     async def get_payment_methods(self, customer_id: str) -> list[Dict[str, Any]]:
         """Get customer's payment methods"""
         try:
-            payment_methods = self.stripe.PaymentMethod.list(
+            payment_methods = await self._call(
+                "list_payment_methods",
+                self.stripe.PaymentMethod.list,
                 customer=customer_id,
                 type="card"
             )
@@ -0,0 +1,97 @@
+"""Catalog query throughput with sync vs async database sessions.
+
+Runs the queries behind the ported catalog endpoints (listing, product detail
+and search) from many coroutines on one event loop, once through the sync
+SessionLocal (called inline, the way the handlers used to) and once through
+AsyncSessionLocal:
+
+    DATABASE_URL=postgresql://... python bench_async_db.py --concurrency 50 --seconds 10
+
+Queries go straight to the database, so the catalog cache never hides the
+cost. Besides requests/sec and latency it reports event loop lag: how late a
+10ms timer fires while the queries run. Sync sessions block the loop for
+every query, so their lag grows with concurrency; async sessions should keep
+it near zero. Run it against a database that already holds some products.
+"""
+import argparse
+import asyncio
+import time
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+from app.database import AsyncSessionLocal, SessionLocal, async_engine
+from app.models import Product
+from app.services.search_service import search_service
+from bench_common import latency_summary
+
+MODES = ["sync", "async"]
+
+def catalog_queries(product_id, term: str) -> dict:
+    """The statements the listing, detail and search endpoints run for a first page"""
+    active = select(Product).options(joinedload(Product.category)).filter(Product.is_active == True)
+    search, rank = search_service.apply(active, term)
+    return {
+        "listing": active.order_by(Product.created_at.desc(), Product.id.desc()).limit(20),
+        "detail": active.filter(Product.id == product_id),
+        "search": search.order_by(rank.desc(), Product.id.desc()).limit(20)
+    }
+
+async def run_sync(stmt):
+    with SessionLocal() as db:
+        db.execute(stmt).unique().scalars().all()
+
+async def run_async(stmt):
+    async with AsyncSessionLocal() as db:
+        (await db.execute(stmt)).unique().scalars().all()
+
+async def client(run, queries: dict, deadline: float, latencies_ms: list):
+    names = list(queries)
+    turn = 0
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        await run(queries[names[turn % len(names)]])
+        latencies_ms.append((time.perf_counter() - started) * 1000)
+        turn += 1
+        # Yield even when the query never awaited, like a server between requests
+        await asyncio.sleep(0)
+
+async def loop_lag(deadline: float, lags_ms: list, interval: float = 0.01):
+    """How late a timer fires: the time the loop spent unable to run anything else"""
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags_ms.append((time.perf_counter() - started - interval) * 1000)
+
+async def bench(mode: str, queries: dict, concurrency: int, seconds: float):
+    run = run_sync if mode == "sync" else run_async
+    latencies_ms, lags_ms = [], []
+    deadline = time.perf_counter() + seconds
+    started = time.perf_counter()
+    await asyncio.gather(
+        loop_lag(deadline, lags_ms),
+        *(client(run, queries, deadline, latencies_ms) for _ in range(concurrency))
+    )
+    elapsed = time.perf_counter() - started
+
+    print(f"\n{mode} sessions, {concurrency} concurrent")
+    print(f"  {len(latencies_ms) / elapsed:.1f} queries/sec")
+    print(f"  query:    {latency_summary(latencies_ms)}")
+    print(f"  loop lag: {latency_summary(lags_ms)}")
+
+async def main(options):
+    with SessionLocal() as db:
+        product_id = db.execute(select(Product.id).filter(Product.is_active == True).limit(1)).scalar()
+    if product_id is None:
+        raise SystemExit("No active products to query; seed some first (e.g. bench_search.py --keep)")
+
+    queries = catalog_queries(product_id, options.term)
+    for mode in options.modes:
+        await bench(mode, queries, options.concurrency, options.seconds)
+    await async_engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Catalog queries with sync vs async sessions")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=10, help="Length of each run")
+    parser.add_argument("--term", default="pump", help="Search term for the search query")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,119 @@
+"""Concurrent checkout benchmark against a running backend.
+
+Creates a product with limited stock and many buyers who each have it in
+their cart, then has every buyer place an order at the same moment:
+
+    uvicorn main:app --workers 4
+    python bench_checkout.py --base-url http://localhost:8000 --buyers 200 --stock 50
+
+It reports orders/sec and latency for the checkout burst, then checks that
+the orders accepted never add up to more than the stock there was (no
+oversell) and that the product's remaining stock matches. Run it against
+two builds to compare their throughput. The script exits non-zero if stock
+was oversold.
+"""
+import argparse
+import secrets
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from bench_common import latency_summary
+
+ADDRESS = {"line1": "1 Benchmark Way", "city": "Testville", "postal_code": "00000", "country": "US"}
+
+def create_buyer(base_url: str, run_id: str, index: int) -> requests.Session:
+    """Register and log in one buyer; returns a session carrying its token"""
+    session = requests.Session()
+    email = f"bench-{run_id}-{index}@example.com"
+    password = secrets.token_urlsafe(12)
+    response = session.post(f"{base_url}/auth/register", json={
+        "email": email,
+        "username": f"bench-{run_id}-{index}",
+        "password": password
+    }, timeout=30)
+    response.raise_for_status()
+
+    response = session.post(f"{base_url}/auth/login", json={"email": email, "password": password}, timeout=30)
+    response.raise_for_status()
+    session.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+    return session
+
+def create_product(session: requests.Session, base_url: str, run_id: str, stock: int) -> dict:
+    response = session.post(f"{base_url}/products/", json={
+        "sku": f"BENCH-{run_id}",
+        "name": f"Checkout benchmark {run_id}",
+        "price": "10.00",
+        "stock_quantity": stock
+    }, timeout=30)
+    response.raise_for_status()
+    return response.json()
+
+def fill_cart(session: requests.Session, base_url: str, product_id: str, quantity: int):
+    session.delete(f"{base_url}/cart/", timeout=30).raise_for_status()
+    session.post(
+        f"{base_url}/cart/", json={"product_id": product_id, "quantity": quantity}, timeout=30
+    ).raise_for_status()
+
+def checkout(session: requests.Session, base_url: str, start: threading.Barrier):
+    """Place an order once every buyer is ready; returns (status, seconds)"""
+    start.wait()
+    started = time.perf_counter()
+    response = session.post(f"{base_url}/orders/", json={
+        "shipping_address": ADDRESS,
+        "billing_address": ADDRESS,
+        "payment_method": "card"
+    }, timeout=120)
+    return response.status_code, time.perf_counter() - started
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent checkout benchmark")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--buyers", type=int, default=100)
+    parser.add_argument("--stock", type=int, default=25)
+    parser.add_argument("--quantity", type=int, default=1, help="Units each buyer orders")
+    parser.add_argument("--setup-workers", type=int, default=8)
+    options = parser.parse_args()
+    base_url = options.base_url.rstrip("/")
+    run_id = secrets.token_hex(4)
+
+    print(f"Creating {options.buyers} buyers...")
+    with ThreadPoolExecutor(options.setup_workers) as pool:
+        buyers = list(pool.map(lambda i: create_buyer(base_url, run_id, i), range(options.buyers)))
+
+    product = create_product(buyers[0], base_url, run_id, options.stock)
+    with ThreadPoolExecutor(options.setup_workers) as pool:
+        list(pool.map(lambda buyer: fill_cart(buyer, base_url, product["id"], options.quantity), buyers))
+
+    print(f"{options.buyers} buyers checking out {options.quantity} each of {options.stock} in stock...")
+    start = threading.Barrier(options.buyers)
+    burst_started = time.perf_counter()
+    with ThreadPoolExecutor(options.buyers) as pool:
+        results = list(pool.map(lambda buyer: checkout(buyer, base_url, start), buyers))
+    elapsed = time.perf_counter() - burst_started
+
+    statuses = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    latencies_ms = [seconds * 1000 for _, seconds in results]
+    accepted = statuses.get(200, 0)
+
+    # /products/{id} may be served from the catalog cache; the batch lookup is not
+    stock_left = None
+    response = requests.get(f"{base_url}/products/batch", params={"ids": product["id"]}, timeout=30)
+    if response.ok and response.json()["products"]:
+        stock_left = response.json()["products"][0]["stock_quantity"]
+
+    print(f"Responses: {dict(sorted(statuses.items()))}")
+    print(f"Burst: {elapsed:.2f}s, {accepted / elapsed:.1f} orders/sec, {len(results) / elapsed:.1f} checkouts/sec")
+    print(f"Latency: {latency_summary(latencies_ms)}")
+
+    sold = accepted * options.quantity
+    print(f"Sold {sold} of {options.stock} in stock, {stock_left} left")
+    oversold = sold > options.stock or (stock_left is not None and stock_left != options.stock - sold)
+    if oversold:
+        print("FAIL  stock was oversold or does not add up")
+    else:
+        print("ok    no oversell")
+    sys.exit(1 if oversold else 0)
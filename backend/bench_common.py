@@ -0,0 +1,17 @@
+"""Helpers shared by the standalone bench_*.py scripts"""
+from typing import List
+
+def percentile(samples: List[float], fraction: float) -> float:
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+def latency_summary(samples_ms: List[float]) -> str:
+    """One-line p50/p95/p99/max summary of latencies in milliseconds"""
+    if not samples_ms:
+        return "no samples"
+    return (
+        f"p50 {percentile(samples_ms, 0.50):.1f}ms, p95 {percentile(samples_ms, 0.95):.1f}ms, "
+        f"p99 {percentile(samples_ms, 0.99):.1f}ms, max {max(samples_ms):.1f}ms"
+    )
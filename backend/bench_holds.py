@@ -0,0 +1,121 @@
+"""Hot-SKU contention benchmark for checkout stock handling.
+
+Many threads place one-unit orders for the same product straight against
+the database, in two modes:
+
+    DATABASE_URL=postgresql://... python bench_holds.py --threads 32 --orders 2000 --work-ms 5
+
+  row-lock  the flow before stock_reservations: lock the product row first,
+            then build the order (--work-ms stands in for pricing and item
+            inserts) and decrement stock, holding the lock until commit
+  holds     the current flow: build the order first, then take the stock
+            with reservation_service.hold() right before the commit
+
+For each mode it reports orders/sec, the time spent waiting for and taking
+the stock, and the whole transaction time. Everything the run creates is
+deleted afterwards.
+"""
+import argparse
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from sqlalchemy import create_engine, delete, insert
+from sqlalchemy.orm import sessionmaker
+from app.config import settings
+from app.models import Order, OrderItem, Product, StockReservation
+from app.services.reservation_service import reservation_service
+from bench_common import latency_summary
+
+def place_order(db, mode: str, product_id, work_seconds: float):
+    """One checkout; returns (order id, stock step seconds, transaction seconds)"""
+    started = time.perf_counter()
+    if mode == "row-lock":
+        lock_started = time.perf_counter()
+        product = db.query(Product).filter(Product.id == product_id).with_for_update().one()
+        stock_seconds = time.perf_counter() - lock_started
+
+    order = Order(total_amount=Decimal("10.00"), payment_method="card")
+    db.add(order)
+    db.flush()
+    db.execute(insert(OrderItem), [{"order_id": order.id, "product_id": product_id, "quantity": 1, "price": Decimal("10.00")}])
+    time.sleep(work_seconds)
+
+    if mode == "row-lock":
+        product.stock_quantity -= 1
+    else:
+        stock_started = time.perf_counter()
+        if reservation_service.hold(db, order.id, {product_id: 1}):
+            raise RuntimeError("Benchmark product ran out of stock")
+        stock_seconds = time.perf_counter() - stock_started
+
+    db.commit()
+    return order.id, stock_seconds, time.perf_counter() - started
+
+def run_mode(session_factory, mode: str, product_id, options) -> list:
+    results = []
+    lock = threading.Lock()
+    remaining = [options.orders]
+
+    def worker():
+        db = session_factory()
+        try:
+            while True:
+                with lock:
+                    if remaining[0] == 0:
+                        return
+                    remaining[0] -= 1
+                result = place_order(db, mode, product_id, options.work_ms / 1000)
+                with lock:
+                    results.append(result)
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(options.threads) as pool:
+        for future in [pool.submit(worker) for _ in range(options.threads)]:
+            future.result()
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hot-SKU checkout contention benchmark")
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--orders", type=int, default=2000, help="Orders per mode")
+    parser.add_argument("--work-ms", type=float, default=5, help="Other in-transaction checkout work per order")
+    parser.add_argument("--modes", nargs="+", default=["row-lock", "holds"], choices=["row-lock", "holds"])
+    options = parser.parse_args()
+
+    engine = create_engine(settings.database_url, pool_size=options.threads, max_overflow=0)
+    session_factory = sessionmaker(bind=engine, autoflush=False)
+    db = session_factory()
+    product = Product(
+        sku=f"BENCH-HOLDS-{secrets.token_hex(3)}",
+        name="Hold contention benchmark",
+        price=Decimal("10.00"),
+        stock_quantity=options.orders * len(options.modes)
+    )
+    db.add(product)
+    db.commit()
+
+    order_ids = []
+    try:
+        for mode in options.modes:
+            started = time.perf_counter()
+            results = run_mode(session_factory, mode, product.id, options)
+            elapsed = time.perf_counter() - started
+            order_ids += [order_id for order_id, _, _ in results]
+
+            print(f"\n{mode}: {len(results)} orders from {options.threads} threads in {elapsed:.2f}s, "
+                  f"{len(results) / elapsed:.1f} orders/sec")
+            print(f"  stock step:  {latency_summary([stock * 1000 for _, stock, _ in results])}")
+            print(f"  transaction: {latency_summary([total * 1000 for _, _, total in results])}")
+    finally:
+        db.rollback()
+        for chunk in range(0, len(order_ids), 1000):
+            ids = order_ids[chunk:chunk + 1000]
+            db.execute(delete(StockReservation).where(StockReservation.order_id.in_(ids)))
+            db.execute(delete(OrderItem).where(OrderItem.order_id.in_(ids)))
+            db.execute(delete(Order).where(Order.id.in_(ids)))
+        db.execute(delete(Product).where(Product.id == product.id))
+        db.commit()
+        db.close()
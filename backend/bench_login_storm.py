@@ -0,0 +1,84 @@
+"""Latency of unrelated endpoints during a login storm.
+
+Probes /health and /products/ at a steady rate, first on an idle server and
+then while many threads hammer /auth/login (every login runs bcrypt):
+
+    uvicorn main:app
+    python bench_login_storm.py --base-url http://localhost:8000 --login-threads 64 --seconds 20
+
+It reports probe latency for both phases and the login outcomes (503s mean
+the password pool shed load). With bcrypt off the event loop, probe p99
+should stay close to its idle value.
+"""
+import argparse
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from bench_common import latency_summary
+
+PROBES = ["/health", "/products/?limit=20"]
+
+def register(base_url: str) -> dict:
+    """Create the account the storm logs in to; returns the login payload"""
+    run_id = secrets.token_hex(4)
+    credentials = {"email": f"bench-login-{run_id}@example.com", "password": secrets.token_urlsafe(12)}
+    response = requests.post(f"{base_url}/auth/register", json={
+        **credentials, "username": f"bench-login-{run_id}"
+    }, timeout=30)
+    response.raise_for_status()
+    return credentials
+
+def probe(base_url: str, seconds: float, interval: float) -> dict:
+    """GET every probe path each ``interval`` for ``seconds``; returns latencies per path"""
+    session = requests.Session()
+    samples = {path: [] for path in PROBES}
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for path in PROBES:
+            started = time.perf_counter()
+            session.get(f"{base_url}{path}", timeout=30)
+            samples[path].append((time.perf_counter() - started) * 1000)
+        time.sleep(interval)
+    return samples
+
+def login_storm(base_url: str, credentials: dict, stop: threading.Event, outcomes: dict, lock: threading.Lock):
+    session = requests.Session()
+    while not stop.is_set():
+        try:
+            status = session.post(f"{base_url}/auth/login", json=credentials, timeout=30).status_code
+        except requests.RequestException:
+            status = "error"
+        with lock:
+            outcomes[status] = outcomes.get(status, 0) + 1
+
+def report(phase: str, samples: dict):
+    print(f"\n{phase}")
+    for path, latencies_ms in samples.items():
+        print(f"  {path:<22} {latency_summary(latencies_ms)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Endpoint latency during a login storm")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--login-threads", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=20, help="Length of each phase")
+    parser.add_argument("--probe-interval", type=float, default=0.05)
+    options = parser.parse_args()
+    base_url = options.base_url.rstrip("/")
+
+    credentials = register(base_url)
+    report("Idle", probe(base_url, options.seconds, options.probe_interval))
+
+    stop = threading.Event()
+    outcomes, lock = {}, threading.Lock()
+    with ThreadPoolExecutor(options.login_threads) as pool:
+        for _ in range(options.login_threads):
+            pool.submit(login_storm, base_url, credentials, stop, outcomes, lock)
+        time.sleep(1)  # Let the storm build up
+        storm_samples = probe(base_url, options.seconds, options.probe_interval)
+        stop.set()
+
+    report(f"During a login storm from {options.login_threads} threads", storm_samples)
+    print(f"  logins: {dict(sorted(outcomes.items(), key=str))}, "
+          f"{sum(outcomes.values()) / (options.seconds + 1):.1f}/sec")
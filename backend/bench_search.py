@@ -0,0 +1,108 @@
+"""Product search latency against catalog size.
+
+Seeds generated products straight into the database in steps, and after
+each step times the full-text/trigram search that /products/search/ runs,
+next to the old ILIKE '%term%' scan for comparison:
+
+    DATABASE_URL=postgresql://... python bench_search.py --sizes 1000 10000 100000
+
+Queries run directly on the database, so the catalog cache never hides the
+cost. With the GIN indexes the search should grow far slower than the
+catalog, while the ILIKE scan grows with it. Seeded products (SKU prefix
+BENCH-SEARCH-) are deleted afterwards unless --keep is given.
+"""
+import argparse
+import random
+import secrets
+import time
+from sqlalchemy import delete, func, insert, or_, select, text
+from app.database import SessionLocal
+from app.models import Product
+from app.services.search_service import search_service
+from bench_common import latency_summary
+
+WORDS = [
+    "hydraulic", "pump", "tractor", "filter", "gasket", "piston", "clutch", "bearing", "valve",
+    "cylinder", "hose", "radiator", "alternator", "starter", "belt", "seal", "axle", "gear",
+    "injector", "sprocket", "chain", "tire", "rim", "blade", "mower", "hitch", "coupler",
+    "thermostat", "manifold", "crankshaft", "camshaft", "linkage", "bushing", "spring", "fan"
+]
+BRANDS = ["Deere", "Kubota", "Massey", "Fendt", "Claas", "Case", "Valtra", "Zetor"]
+
+# (label, search term): a common word, a rare word, a prefix, a typo, two words
+QUERIES = [
+    ("common word", "pump"),
+    ("rare word", "crankshaft"),
+    ("prefix", "hydr"),
+    ("typo", "hydrolic"),
+    ("two words", "tractor filter")
+]
+
+def product_rows(prefix: str, start: int, count: int):
+    rng = random.Random(start)
+    for number in range(start, start + count):
+        words = rng.sample(WORDS, 3)
+        yield {
+            "sku": f"{prefix}{number}",
+            "name": f"{rng.choice(BRANDS)} {words[0]} {words[1]}",
+            "description": f"Replacement {words[2]} for {rng.choice(BRANDS)} series {rng.randint(100, 999)}",
+            "price": rng.randint(5, 500),
+            "stock_quantity": rng.randint(0, 50)
+        }
+
+def seed(db, prefix: str, start: int, count: int, chunk_size: int = 5000):
+    rows = list(product_rows(prefix, start, count))
+    for offset in range(0, len(rows), chunk_size):
+        db.execute(insert(Product), rows[offset:offset + chunk_size])
+        db.commit()
+    db.execute(text("ANALYZE products"))
+    db.commit()
+
+def search_statement(term: str):
+    stmt, rank = search_service.apply(select(Product.id).filter(Product.is_active == True), term)
+    return stmt.order_by(rank.desc()).limit(20)
+
+def ilike_statement(term: str):
+    pattern = f"%{term}%"
+    return select(Product.id).filter(
+        Product.is_active == True,
+        or_(Product.name.ilike(pattern), Product.description.ilike(pattern))
+    ).order_by(Product.created_at.desc()).limit(20)
+
+def time_statement(db, stmt, repeat: int) -> list:
+    db.execute(stmt).all()  # Warm up the plan and buffers
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        db.execute(stmt).all()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Product search latency against catalog size")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="Seeded catalog sizes to measure at, ascending")
+    parser.add_argument("--repeat", type=int, default=30, help="Timed runs per query and size")
+    parser.add_argument("--keep", action="store_true", help="Keep the seeded products")
+    options = parser.parse_args()
+    prefix = f"BENCH-SEARCH-{secrets.token_hex(3)}-"
+
+    db = SessionLocal()
+    try:
+        seeded = 0
+        for size in sorted(options.sizes):
+            seed(db, prefix, seeded, size - seeded)
+            seeded = size
+            total = db.execute(select(func.count()).select_from(Product)).scalar()
+            print(f"\n{seeded} seeded products ({total} in the catalog)")
+            for label, term in QUERIES:
+                search_ms = time_statement(db, search_statement(term), options.repeat)
+                ilike_ms = time_statement(db, ilike_statement(term), options.repeat)
+                print(f"  {label:<12} {term!r:<18} search: {latency_summary(search_ms)}")
+                print(f"  {'':<12} {'':<18} ILIKE:  {latency_summary(ilike_ms)}")
+    finally:
+        if not options.keep:
+            db.rollback()
+            db.execute(delete(Product).where(Product.sku.like(f"{prefix}%")))
+            db.commit()
+        db.close()
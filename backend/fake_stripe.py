@@ -0,0 +1,162 @@
+"""Minimal offline stand-in for the parts of the Stripe API the backend uses.
+
+Run it and point the backend at it:
+
+    python fake_stripe.py --port 12111 --latency-ms 150 --error-rate 0.1
+    STRIPE_API_BASE=http://localhost:12111 STRIPE_SECRET_KEY=sk_test_fake uvicorn main:app
+
+--latency-ms delays every response and --error-rate answers that fraction of
+requests with a retryable 500, to exercise StripeService's timeouts and
+retries. Payment intents are kept in memory; POST
+/v1/payment_intents/{id}/confirm marks one as succeeded (or start with
+--auto-succeed). Requests repeating an Idempotency-Key get the original
+response, like the real API.
+"""
+import argparse
+import json
+import random
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+STATE = {"payment_intents": {}, "idempotent_responses": {}}
+LOCK = threading.Lock()
+OPTIONS = argparse.Namespace(latency_ms=0, error_rate=0.0, auto_succeed=False)
+
+def new_id(prefix: str) -> str:
+    return f"{prefix}_{secrets.token_hex(12)}"
+
+def parse_form(body: str) -> dict:
+    """Decode Stripe's form encoding, e.g. metadata[order_id]=... into nested dicts"""
+    params = {}
+    for key, value in parse_qsl(body, keep_blank_values=True):
+        if "[" in key:
+            outer, inner = key.split("[", 1)
+            params.setdefault(outer, {})[inner.rstrip("]")] = value
+        else:
+            params[key] = value
+    return params
+
+def payment_intent(params: dict) -> dict:
+    intent_id = new_id("pi")
+    return {
+        "id": intent_id,
+        "object": "payment_intent",
+        "amount": int(params.get("amount", 0)),
+        "currency": params.get("currency", "usd"),
+        "metadata": params.get("metadata", {}),
+        "client_secret": f"{intent_id}_secret_{secrets.token_hex(8)}",
+        "status": "succeeded" if OPTIONS.auto_succeed else "requires_payment_method",
+        "created": int(time.time())
+    }
+
+def handle(method: str, path: list, params: dict):
+    """Returns (status, body) for a request"""
+    intents = STATE["payment_intents"]
+
+    if path[:2] == ["v1", "payment_intents"]:
+        if method == "POST" and len(path) == 2:
+            intent = payment_intent(params)
+            intents[intent["id"]] = intent
+            return 200, intent
+        intent = intents.get(path[2]) if len(path) > 2 else None
+        if intent is None:
+            return 404, error("resource_missing", "No such payment_intent")
+        if method == "GET" and len(path) == 3:
+            return 200, intent
+        if method == "POST" and len(path) == 3:
+            if intent["status"] == "succeeded":
+                return 400, error("payment_intent_unexpected_state", "PaymentIntent already succeeded")
+            for field in ("amount", "currency"):
+                if field in params:
+                    intent[field] = int(params[field]) if field == "amount" else params[field]
+            intent["metadata"].update(params.get("metadata", {}))
+            return 200, intent
+        if method == "POST" and path[3:] == ["confirm"]:
+            intent["status"] = "succeeded"
+            return 200, intent
+
+    if method == "POST" and path == ["v1", "refunds"]:
+        intent = intents.get(params.get("payment_intent"))
+        if intent is None:
+            return 404, error("resource_missing", "No such payment_intent")
+        return 200, {
+            "id": new_id("re"),
+            "object": "refund",
+            "amount": int(params.get("amount", intent["amount"])),
+            "status": "succeeded",
+            "reason": None
+        }
+
+    if method == "POST" and path == ["v1", "customers"]:
+        return 200, {
+            "id": new_id("cus"),
+            "object": "customer",
+            "email": params.get("email"),
+            "name": params.get("name")
+        }
+
+    if method == "GET" and path == ["v1", "payment_methods"]:
+        return 200, {"object": "list", "data": [], "has_more": False, "url": "/v1/payment_methods"}
+
+    return 404, error("resource_missing", f"Unrecognized request URL ({method} /{'/'.join(path)})")
+
+def error(code: str, message: str) -> dict:
+    return {"error": {"type": "invalid_request_error", "code": code, "message": message}}
+
+class FakeStripeHandler(BaseHTTPRequestHandler):
+    def _respond(self, status: int, body: dict, headers: dict = None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("Request-Id", new_id("req"))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _dispatch(self, method: str):
+        if OPTIONS.latency_ms:
+            time.sleep(OPTIONS.latency_ms / 1000)
+
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode() if length else url.query
+
+        if random.random() < OPTIONS.error_rate:
+            self._respond(500, {"error": {"type": "api_error", "message": "Injected failure"}},
+                          {"Stripe-Should-Retry": "true"})
+            return
+
+        idempotency_key = self.headers.get("Idempotency-Key")
+        with LOCK:
+            if idempotency_key and idempotency_key in STATE["idempotent_responses"]:
+                status, response = STATE["idempotent_responses"][idempotency_key]
+            else:
+                status, response = handle(method, url.path.strip("/").split("/"), parse_form(body))
+                if idempotency_key and method == "POST":
+                    STATE["idempotent_responses"][idempotency_key] = (status, response)
+        self._respond(status, response)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def log_message(self, format, *args):
+        print(f"fake-stripe: {self.command} {self.path}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline fake Stripe API")
+    parser.add_argument("--port", type=int, default=12111)
+    parser.add_argument("--latency-ms", type=int, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--auto-succeed", action="store_true")
+    OPTIONS = parser.parse_args()
+
+    print(f"Fake Stripe listening on http://localhost:{OPTIONS.port}")
+    ThreadingHTTPServer(("0.0.0.0", OPTIONS.port), FakeStripeHandler).serve_forever()
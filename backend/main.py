@@ -1,8 +1,16 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from app.config import settings
-from app.api import auth, products, cart, chat, orders, upload
+from app.api import auth, products, cart, chat, orders, upload, metrics, reviews, webhooks
+from app.pagination import NEXT_CURSOR_HEADER
+from app.database import start_statement_count
+from app.services.autocomplete_service import autocomplete_service
+from app.services.reservation_service import reservation_service
+from app.services.payment_event_service import payment_event_service
+from app.services.google_auth_service import google_auth_service
+import asyncio
 import uvicorn
 
 # Create FastAPI app
@@ -21,6 +29,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "Idempotent-Replayed"],
 )
 
 # Add trusted host middleware
@@ -29,13 +38,43 @@ app.add_middleware(
     allowed_hosts=["*"]  # In production, specify exact hosts
 )
 
+# Fail requests that issue too many SQL statements (catches N+1 regressions)
+if settings.max_statements_per_request is not None:
+    @app.middleware("http")
+    async def statement_budget(request: Request, call_next):
+        counter = start_statement_count()
+        response = await call_next(request)
+        if counter.count > settings.max_statements_per_request:
+            print(f"{request.method} {request.url.path} issued {counter.count} SQL statements")
+            return JSONResponse(
+                status_code=500,
+                content={
+                    "detail": f"Request issued {counter.count} SQL statements "
+                              f"(limit {settings.max_statements_per_request})"
+                }
+            )
+        response.headers["X-DB-Statements"] = str(counter.count)
+        return response
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(products.router)
+app.include_router(reviews.router)
 app.include_router(cart.router)
 app.include_router(chat.router, prefix="/api")
 app.include_router(orders.router)
 app.include_router(upload.router)
+app.include_router(metrics.router)
+app.include_router(webhooks.router)
+
+@app.on_event("startup")
+async def start_background_tasks():
+    """Start in-process background jobs"""
+    asyncio.create_task(autocomplete_service.run_refresh_loop(settings.autocomplete_refresh_seconds))
+    asyncio.create_task(reservation_service.run_reaper_loop(settings.reservation_reap_interval_seconds))
+    asyncio.create_task(payment_event_service.run_worker())
+    if settings.google_client_id:
+        asyncio.create_task(google_auth_service.run_refresh_loop())
 
 @app.get("/")
 async def root():
@@ -0,0 +1,49 @@
+"""Smoke checks against a running backend.
+
+Run it against a server with some catalog data loaded:
+
+    uvicorn main:app
+    python smoke_check.py --base-url http://localhost:8000
+
+Each check calls one endpoint over HTTP and verifies the status code and
+the shape of the response. The script exits non-zero if any check fails.
+"""
+import argparse
+import sys
+import requests
+
+def check_listing_with_facets(session: requests.Session, base_url: str, path: str, params: dict):
+    response = session.get(f"{base_url}{path}", params=params, timeout=10)
+    assert response.status_code == 200, f"status {response.status_code}: {response.text[:200]}"
+    body = response.json()
+    assert isinstance(body.get("items"), list), "missing items"
+    facets = body.get("facets")
+    assert isinstance(facets, dict), "missing facets"
+    for field in ("categories", "price_ranges", "availability"):
+        assert field in facets, f"facets missing {field}"
+
+CHECKS = [
+    ("products listing with facets", check_listing_with_facets,
+     "/products/", {"facets": "true"}),
+    ("products listing with facets (cached)", check_listing_with_facets,
+     "/products/", {"facets": "true"}),
+    ("product search with facets", check_listing_with_facets,
+     "/products/search/", {"q": "x", "facets": "true"}),
+]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Smoke checks against a running backend")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    options = parser.parse_args()
+
+    session = requests.Session()
+    failures = 0
+    for name, check, path, params in CHECKS:
+        try:
+            check(session, options.base_url.rstrip("/"), path, params)
+            print(f"ok    {name}")
+        except (AssertionError, requests.RequestException, ValueError) as e:
+            failures += 1
+            print(f"FAIL  {name}: {e}")
+
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,76 @@
+"""Batch cart changes on the Redis cart store, run through InMemoryHashClient
+(the Python mirror of its Lua scripts) so no Redis server is needed.
+
+Product lookups are served by a stub session. The database store's batch
+upsert is checked by compiling it for Postgres.
+"""
+import uuid
+from types import SimpleNamespace
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql
+from app.services.cart_store import DatabaseCartStore, InMemoryHashClient, RedisCartStore
+
+PUMP = uuid.uuid4()
+FILTER = uuid.uuid4()
+STOCK = {PUMP: 5, FILTER: 2}
+
+class StubQuery:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def options(self, *args):
+        return self
+
+    def filter(self, *args):
+        return self
+
+    def all(self):
+        return self.rows
+
+class StubSession:
+    """Answers the stock query of apply_batch and the product query of list_items"""
+
+    def query(self, *entities):
+        if len(entities) == 2:
+            return StubQuery(list(STOCK.items()))
+        return StubQuery([SimpleNamespace(id=product_id) for product_id in STOCK])
+
+@pytest.fixture
+def store():
+    return RedisCartStore(InMemoryHashClient(), ttl_seconds=60)
+
+def quantities(store, user_id):
+    return {line.product_id: line.quantity for line in store._lines(user_id)}
+
+def test_batch_adds_and_sets_lines(store):
+    user_id = uuid.uuid4()
+    store.apply_batch(StubSession(), user_id, {PUMP: ("add", 2), FILTER: ("set", 1)})
+    store.apply_batch(StubSession(), user_id, {PUMP: ("add", 3), FILTER: ("set", 2)})
+    assert quantities(store, user_id) == {PUMP: 5, FILTER: 2}
+
+def test_set_to_zero_removes_the_line(store):
+    user_id = uuid.uuid4()
+    store.apply_batch(StubSession(), user_id, {PUMP: ("add", 1), FILTER: ("add", 1)})
+    items = store.apply_batch(StubSession(), user_id, {FILTER: ("set", 0)})
+    assert [item.product_id for item in items] == [PUMP]
+
+def test_batch_short_on_stock_changes_nothing(store):
+    user_id = uuid.uuid4()
+    store.apply_batch(StubSession(), user_id, {PUMP: ("add", 4)})
+    with pytest.raises(HTTPException) as error:
+        store.apply_batch(StubSession(), user_id, {FILTER: ("set", 1), PUMP: ("add", 2)})
+    assert error.value.status_code == 400
+    assert str(PUMP) in error.value.detail
+    assert quantities(store, user_id) == {PUMP: 4}
+
+def test_unknown_product_is_rejected(store):
+    with pytest.raises(HTTPException) as error:
+        store.apply_batch(StubSession(), uuid.uuid4(), {uuid.uuid4(): ("add", 1)})
+    assert error.value.status_code == 404
+
+def test_database_batch_additions_are_capped_at_stock():
+    stmt = DatabaseCartStore()._upsert(uuid.uuid4(), {PUMP: 2}, increment=True, cap_at_stock=True)
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+    assert "SET quantity = least(cart_items.quantity + excluded.quantity, (SELECT products.stock_quantity" in sql
+    assert "WHERE products.id = excluded.product_id)" in sql
@@ -0,0 +1,90 @@
+"""Faceted product listing and search endpoints.
+
+The database is replaced by stubs for the facet and page queries, so these
+tests cover the request handling around them: cache keys, facet caching and
+the listing response shape. The facet query itself is checked by compiling it
+for Postgres and feeding its row shape through the summarizer.
+"""
+from types import SimpleNamespace
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+from app.api import products
+from app.database import get_async_db
+from app.models import Product
+from app.services.cache_service import catalog_cache
+from main import app
+
+FACETS = {
+    "categories": [],
+    "price_ranges": [{"label": "0-50", "min": 0, "max": 50, "count": 0}],
+    "availability": {"in_stock": 0, "out_of_stock": 0}
+}
+
+async def fake_async_db():
+    yield None
+
+@pytest.fixture
+def client(monkeypatch):
+    async def compute_async(db, stmt):
+        return FACETS
+
+    async def keyset_page_async(db, stmt, sort_key, tiebreaker, limit, skip=0, cursor=None):
+        return [], None
+
+    monkeypatch.setattr(products.facet_service, "compute_async", compute_async)
+    monkeypatch.setattr(products, "keyset_page_async", keyset_page_async)
+    app.dependency_overrides[get_async_db] = fake_async_db
+    catalog_cache.clear()
+    # No context manager, so the startup background jobs never run
+    yield TestClient(app)
+    app.dependency_overrides.pop(get_async_db, None)
+    catalog_cache.clear()
+
+@pytest.mark.parametrize("path, params", [
+    ("/products/", {"facets": "true"}),
+    ("/products/", {"facets": "true", "search": "pump"}),
+    ("/products/search/", {"q": "pump", "facets": "true"}),
+])
+def test_listing_with_facets(client, path, params):
+    for _ in range(2):  # The second request is served from the catalog cache
+        response = client.get(path, params=params)
+        assert response.status_code == 200, response.text
+        assert response.json() == {"items": [], "facets": FACETS}
+
+def test_listing_without_facets_is_a_plain_list(client):
+    response = client.get("/products/")
+    assert response.status_code == 200, response.text
+    assert response.json() == []
+
+def test_facet_query_is_one_grouping_sets_query():
+    stmt = select(Product).filter(Product.is_active == True)
+    sql = str(products.facet_service.statement(stmt).compile(dialect=postgresql.dialect()))
+    assert sql.count("SELECT") == 1
+    assert "GROUP BY GROUPING SETS(products.category_id, CASE" in sql
+    assert "grouping(products.category_id) AS by_category" in sql
+    assert "WHERE products.is_active = true" in sql
+
+def test_facet_rows_are_shaped_into_facets():
+    def row(category_id=None, price_bucket=None, in_stock=None, by_category=1, by_price=1, count=0):
+        return SimpleNamespace(
+            category_id=category_id, price_bucket=price_bucket, in_stock=in_stock,
+            by_category=by_category, by_price=by_price, count=count
+        )
+
+    facets = products.facet_service._summarize([
+        row(category_id="a", by_category=0, count=2),
+        row(category_id="b", by_category=0, count=5),
+        row(price_bucket=0, by_price=0, count=4),
+        row(price_bucket=6, by_price=0, count=3),
+        row(in_stock=True, count=6),
+        row(in_stock=False, count=1),
+    ])
+    assert facets["categories"] == [
+        {"category_id": "b", "count": 5}, {"category_id": "a", "count": 2}
+    ]
+    assert facets["price_ranges"][0] == {"label": "0-50", "min": 0, "max": 50, "count": 4}
+    assert facets["price_ranges"][1]["count"] == 0
+    assert facets["price_ranges"][-1] == {"label": "2500+", "min": 2500, "max": None, "count": 3}
+    assert facets["availability"] == {"in_stock": 6, "out_of_stock": 1}
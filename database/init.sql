@@ -1,5 +1,6 @@
 -- Create extensions
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
 
 -- Create users table
 CREATE TABLE IF NOT EXISTS users (
@@ -31,6 +32,7 @@ CREATE TABLE IF NOT EXISTS categories (
 -- Create products table
 CREATE TABLE IF NOT EXISTS products (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    sku VARCHAR(100) UNIQUE,
     name VARCHAR(255) NOT NULL,
     description TEXT,
     price DECIMAL(10,2) NOT NULL,
@@ -42,8 +44,13 @@ CREATE TABLE IF NOT EXISTS products (
     is_featured BOOLEAN DEFAULT FALSE,
     rating DECIMAL(3,2) DEFAULT 0.0,
     review_count INTEGER DEFAULT 0,
+    rating_total INTEGER DEFAULT 0,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    search_vector TSVECTOR GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED
 );
 
 -- Create cart_items table
@@ -65,6 +72,10 @@ CREATE TABLE IF NOT EXISTS orders (
     status VARCHAR(50) DEFAULT 'pending',
     payment_method VARCHAR(50),
     payment_status VARCHAR(50) DEFAULT 'pending',
+    payment_intent_id VARCHAR(255),
+    payment_client_secret VARCHAR(255),
+    payment_intent_amount DECIMAL(10,2),
+    payment_intent_currency VARCHAR(3),
     shipping_address JSONB,
     billing_address JSONB,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
@@ -81,6 +92,47 @@ CREATE TABLE IF NOT EXISTS order_items (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Create stock_reservations table (checkout stock holds)
+CREATE TABLE IF NOT EXISTS stock_reservations (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    order_id UUID NOT NULL REFERENCES orders(id) ON DELETE CASCADE,
+    product_id UUID NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    quantity INTEGER NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'held',
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Create payment_events table (verified Stripe webhook events awaiting processing)
+CREATE TABLE IF NOT EXISTS payment_events (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    event_id VARCHAR(255) UNIQUE NOT NULL,
+    event_type VARCHAR(100) NOT NULL,
+    payment_intent_id VARCHAR(255) NOT NULL,
+    order_id UUID,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    refund_due BOOLEAN NOT NULL DEFAULT false,
+    next_attempt_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    processed_at TIMESTAMP WITH TIME ZONE
+);
+
+-- Create idempotency_keys table (stored responses for retried POSTs)
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    key VARCHAR(255) NOT NULL,
+    request_path VARCHAR(255) NOT NULL,
+    request_hash VARCHAR(64) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'in_progress',
+    response_status INTEGER,
+    response_body TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(user_id, key)
+);
+
 -- Create chat_messages table for AI chat
 CREATE TABLE IF NOT EXISTS chat_messages (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
@@ -110,10 +162,18 @@ CREATE INDEX IF NOT EXISTS idx_users_google_id ON users(google_id);
 CREATE INDEX IF NOT EXISTS idx_products_category_id ON products(category_id);
 CREATE INDEX IF NOT EXISTS idx_products_is_active ON products(is_active);
 CREATE INDEX IF NOT EXISTS idx_products_is_featured ON products(is_featured);
+CREATE INDEX IF NOT EXISTS idx_products_search_vector ON products USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_products_name_trgm ON products USING GIN (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_products_created_at_id ON products(created_at, id);
+CREATE INDEX IF NOT EXISTS idx_products_category_created_at_id ON products(category_id, created_at, id);
 CREATE INDEX IF NOT EXISTS idx_cart_items_user_id ON cart_items(user_id);
 CREATE INDEX IF NOT EXISTS idx_orders_user_id ON orders(user_id);
+CREATE INDEX IF NOT EXISTS idx_orders_user_id_created_at_id ON orders(user_id, created_at, id);
 CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status);
 CREATE INDEX IF NOT EXISTS idx_order_items_order_id ON order_items(order_id);
+CREATE INDEX IF NOT EXISTS idx_stock_reservations_order_id ON stock_reservations(order_id);
+CREATE INDEX IF NOT EXISTS idx_stock_reservations_status_expires_at ON stock_reservations(status, expires_at);
+CREATE INDEX IF NOT EXISTS idx_payment_events_status_next_attempt_at ON payment_events(status, next_attempt_at);
 CREATE INDEX IF NOT EXISTS idx_chat_messages_user_id ON chat_messages(user_id);
 CREATE INDEX IF NOT EXISTS idx_reviews_product_id ON reviews(product_id);
 
@@ -126,7 +186,7 @@ INSERT INTO categories (name, description, image_url) VALUES
 ('Attachments', 'Tractor attachments and implements', 'https://images.unsplash.com/photo-1581094794329-c8112a89af12?w=400');
 
 -- Insert sample products
-INSERT INTO products (name, description, price, category_id, image_urls, stock_quantity, is_featured, rating, review_count) 
+INSERT INTO products (name, description, price, category_id, image_urls, stock_quantity, is_featured, rating, review_count, rating_total) 
 SELECT 
     p.name,
     p.description,
@@ -136,7 +196,8 @@ SELECT
     p.stock_quantity,
     p.is_featured,
     p.rating,
-    p.review_count
+    p.review_count,
+    ROUND(p.rating * p.review_count)
 FROM (VALUES
     ('Tractor Hydraulic Pump', 'High-pressure hydraulic pump for tractors and construction equipment', 1299.99, 'Hydraulic Systems', ARRAY['https://images.unsplash.com/photo-1581094794329-c8112a89af12?w=400'], 15, true, 4.8, 25),
     ('Heavy Duty Tractor Tires', 'Premium agricultural tires for all terrain conditions', 899.99, 'Tires & Wheels', ARRAY['https://images.unsplash.com/photo-1558618047-3c8c76ca7d13?w=400'], 8, true, 4.9, 18),